@@ -0,0 +1,177 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from scripts.recorder import Recorder, RecordingOptions
+from scripts.synthetic import KINDS, SyntheticBackend
+from scripts.formats import EXTENSIONS, FORMATS
+from scripts.palette import DITHER_MODES
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def peakMemory():
+    # Peak resident memory of this process in bytes, where we can tell
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def runCase(case):
+    # Records case["frames"] synthetic frames through the full pipeline
+    width, height = case["size"]
+    region = {"left": 0, "top": 0, "width": width, "height": height}
+    screen = SyntheticBackend(case["kind"], case["seed"])
+
+    options = RecordingOptions(**case["options"])
+
+    with tempfile.TemporaryDirectory(prefix="gifcapture_bench_") as directory:
+        path = os.path.join(directory, "bench" + EXTENSIONS[options.format])
+        recorder = Recorder(region, path, options, screen)
+
+        start = time.perf_counter()
+        stats = recorder.run(lambda: screen.frames >= case["frames"])
+        total = time.perf_counter() - start
+
+    stats["total_time"] = round(total, 3)
+    stats["frames_per_second"] = round(stats["frames"] / total, 2)
+    stats["peak_memory"] = peakMemory()
+    return stats
+
+
+def runIsolated(case):
+    # A fresh process per case keeps peak memory numbers separate
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(runCase, (case,))
+
+
+def measureStartup(runs):
+    # Launches the app until its first paint, in ms per run
+    directory = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, os.path.join(directory, "gifcapture.py"), "--startup-time"],
+            capture_output=True, text=True, cwd=directory, timeout=60).stdout
+        match = re.search(r"First paint after (\d+) ms", output)
+        if match:
+            times.append(int(match.group(1)))
+    return times
+
+
+def version():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parseSize(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(
+        description="Measure capture and encode throughput on synthetic frames.")
+    parser.add_argument("--kinds", nargs="+", default=KINDS, choices=KINDS)
+    parser.add_argument("--fps", nargs="+", type=int, default=[15])
+    parser.add_argument("--sizes", nargs="+", type=parseSize,
+                        default=[(640, 480), (1920, 1080)], help="WIDTHxHEIGHT")
+    parser.add_argument("--scales", nargs="+", type=float, default=[0.75])
+    parser.add_argument("--lossy", nargs="+", type=int, default=[0, 35])
+    parser.add_argument("--dither", nargs="+", default=["none"], choices=DITHER_MODES)
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--optimizer", default="builtin",
+                        choices=["gifsicle", "builtin", "none"])
+    parser.add_argument("--format", default="gif", choices=FORMATS)
+    parser.add_argument("--no-streaming", action="store_true")
+    parser.add_argument("--no-transparency", action="store_true")
+    parser.add_argument("--target-size", type=float, default=0, metavar="MB",
+                        help="fit each GIF under this size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--startup", type=int, default=0, metavar="RUNS",
+                        help="also time the app's first paint over this many launches")
+    parser.add_argument("-o", "--output", default="benchmark.json")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parseArguments(argv)
+
+    results = []
+    cases = itertools.product(args.kinds, args.fps, args.sizes, args.scales, args.lossy,
+                              args.dither)
+    for kind, fps, size, scale, lossy, dither in cases:
+        case = {
+            "kind": kind,
+            "size": size,
+            "frames": args.frames,
+            "seed": args.seed,
+            "options": {
+                "fps": fps,
+                "scale": scale,
+                "lossiness": lossy,
+                "dither": dither,
+                "optimize": args.optimizer != "none",
+                "optimizer": "gifsicle" if args.optimizer == "none" else args.optimizer,
+                "streaming": not args.no_streaming,
+                "transparency": not args.no_transparency,
+                "target_size": args.target_size,
+                "format": args.format,
+            },
+        }
+
+        stats = runIsolated(case)
+        results.append({**case, "stats": stats})
+
+        print(f"{kind:>8} {size[0]}x{size[1]} fps={fps} scale={scale} lossy={lossy} "
+              f"dither={dither}: "
+              f"{stats['frames_per_second']} frames/s, encode {stats['encode_time']}s, "
+              f"{stats['size']} bytes, "
+              f"stop->file {stats['stop_to_file']}s")
+        if "target" in stats:
+            print(f"{'':>8} fit: {stats['target']}")
+
+    startup = None
+    if args.startup:
+        times = measureStartup(args.startup)
+        startup = {"runs": times,
+                   "median_ms": statistics.median(times) if times else None}
+        print(f"startup: first paint after {startup['median_ms']} ms (median)")
+
+    report = {
+        "version": version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+        "startup": startup,
+    }
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,17 @@
+import time
+
+# Time to first paint is measured from here
+STARTED = time.perf_counter()
+
 import os
-import subprocess
 import sys
-from PyQt6.QtCore import Qt, QRectF, QPoint, QRectF, QPointF
-from PyQt6.QtGui import QPainter, QPen, QColor, QPainterPath, QMouseEvent, QPaintEvent
+from PyQt6.QtCore import Qt, QRectF, QPoint, QRectF, QPointF, QTimer
+from PyQt6.QtGui import QPainter, QPen, QColor, QMouseEvent, QPaintEvent, QPixmap, QRegion, QKeySequence, QShortcut
 import PyQt6.QtWidgets as wgs
 from scripts.buttons import Buttons, ProgramState
-from pygifsicle import gifsicle
+from scripts.service import CaptureService, OVERLAY_DELAY
+from scripts.control import ControlServer, sendCommand
+import scripts.saved as settings
 
 
 try:
@@ -16,10 +22,36 @@ except ImportError:
     pass
 
 
-class MainWindow(wgs.QWidget):
+# How far the selection border and its handles reach past the rectangle
+HANDLE_MARGIN = 16
+
+
+# Paint times of the overlay, summed up after each drag when started with
+# --repaint-stats
+class RepaintTimes:
 
     def __init__(self):
+        self.times = []
+
+    def add(self, elapsed):
+        self.times.append(elapsed)
+
+    def report(self):
+        if self.times and "--repaint-stats" in sys.argv:
+            times = sorted(self.times)
+            mean = sum(times) / len(times)
+            p95 = times[min(round(len(times) * 0.95), len(times) - 1)]
+            print(f"Repaints: {len(times)}, mean {mean * 1000:.2f} ms, "
+                  f"p95 {p95 * 1000:.2f} ms, max {times[-1] * 1000:.2f} ms")
+        self.times = []
+
+
+class MainWindow(wgs.QWidget):
+
+    def __init__(self, service, resident=False):
         super().__init__()
+        self.service = service
+        self.resident = resident
         # Get desktop size
         self.desktop_height = wgs.QApplication.primaryScreen().geometry().height()
         self.desktop_width = wgs.QApplication.primaryScreen().geometry().width()
@@ -30,6 +62,20 @@ class MainWindow(wgs.QWidget):
         self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
 
         self.locked = False
+        self.startup_time = None
+        self.repaint_times = RepaintTimes()
+
+        # The dimmed screen around the selection, drawn once
+        self.dimmed = None
+
+        # Mouse moves are applied at most once per display refresh, the
+        # latest one waits in pending_pos
+        self.pending_pos = None
+        refresh_rate = wgs.QApplication.primaryScreen().refreshRate() or 60
+        self.move_timer = QTimer(self)
+        self.move_timer.setSingleShot(True)
+        self.move_timer.setInterval(max(round(1000 / refresh_rate), 1))
+        self.move_timer.timeout.connect(self.moveTimeout)
         # Selection Area
         self.start_pos = QPoint()
         self.end_pos = QPoint()
@@ -84,6 +130,14 @@ class MainWindow(wgs.QWidget):
         buttons_view.setParent(selection_view)
         self.buttons_view = buttons_view
 
+        # Regions set over the control socket show as the selection
+        service.regionChanged.connect(self.setSelection)
+
+        # Starts and stops recording while the overlay has focus
+        self.shortcut = QShortcut(self)
+        self.shortcut.activated.connect(self.toggleRecording)
+        self.updateShortcut()
+
         # Layout
         layout = wgs.QVBoxLayout()
         layout.addWidget(selection_view)
@@ -120,8 +174,27 @@ class MainWindow(wgs.QWidget):
         for corner in self.selection_corners:
             corner.setVisible(visible)
 
+    def dimmedLayer(self):
+        if self.dimmed is None or self.dimmed.size() != self.size():
+            self.dimmed = QPixmap(self.size())
+            self.dimmed.fill(QColor(0, 0, 0, 128))
+        return self.dimmed
+
+    def changedRegion(self, old, new):
+        # What moving the selection from old to new changes on screen: where
+        # it went from dimmed to clear or back, and the border and handles
+        # at both places
+        region = QRegion(old.toAlignedRect()).xored(QRegion(new.toAlignedRect()))
+        margin = HANDLE_MARGIN
+        for rect in (old, new):
+            outer = rect.adjusted(-margin, -margin, margin, margin).toAlignedRect()
+            inner = rect.adjusted(margin, margin, -margin, -margin).toAlignedRect()
+            region = region.united(QRegion(outer).subtracted(QRegion(inner)))
+        return region
+
     def paintEvent(self, event: QPaintEvent):
 
+        start = time.perf_counter()
         painter = QPainter(self)
 
         if (self.locked):
@@ -139,28 +212,80 @@ class MainWindow(wgs.QWidget):
                 self.selected_area.rect().adjusted(-2, -2, 2, 2))
             return
 
-        painter.setPen(Qt.PenStyle.NoPen)
-        # set the brush color with alpha to 0
+        # Only the part of the repainted area outside the selection gets
+        # the dimmed layer, the selection stays clear
+        mask_rect = self.selected_area.rect().normalized().toAlignedRect()
+        dimmed = event.region().subtracted(QRegion(mask_rect))
+        if not dimmed.isEmpty():
+            painter.setClipRegion(dimmed)
+            bounds = dimmed.boundingRect()
+            painter.drawPixmap(bounds, self.dimmedLayer(), bounds)
+        painter.end()
+
+        self.repaint_times.add(time.perf_counter() - start)
 
-        background_rect = QRectF(self.rect())
-        mask_rect = self.selected_area.rect()
+        if self.startup_time is None:
+            self.startup_time = time.perf_counter() - STARTED
+            QTimer.singleShot(0, self.reportStartup)
 
-        # Create a new path that excludes the area of the original rectangle
-        exclude_path = QPainterPath()
-        exclude_path.addRect(background_rect)
-        exclude_path.addRect(mask_rect.normalized())
-        painter.setClipPath(exclude_path, Qt.ClipOperation.IntersectClip)
-        painter.setBrush(QColor(0, 0, 0, 128))
-        painter.drawRect(self.rect())
+    def reportStartup(self):
+        print(f"First paint after {self.startup_time * 1000:.0f} ms")
+
+        # For benchmark.py --startup, which only wants the number
+        if "--startup-time" in sys.argv:
+            self.closeApp()
 
     def keyPressEvent(self, event):
         if event.key() == Qt.Key.Key_Escape:
             self.closeApp()
 
     def closeApp(self):
+        # A resident app only hides the overlay and keeps listening
+        if self.resident:
+            self.hide()
+            return
+        self.quitApp()
+
+    def quitApp(self):
         self.close()
+        self.service.shutdown()
         app.quit()
 
+    def showOverlay(self):
+        self.show()
+        self.raise_()
+        self.activateWindow()
+
+    def showEvent(self, event):
+        # Recordings wait for the overlay to get out of the way
+        self.service.start_delay = OVERLAY_DELAY
+        return super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.service.start_delay = 0
+        return super().hideEvent(event)
+
+    def updateShortcut(self):
+        self.shortcut.setKey(QKeySequence(settings.GlobalSettings.value(
+            settings.SETTING_SHORTCUT, settings.defaultShortcut)))
+
+    def toggleRecording(self):
+        if self.selected_area.rect().isEmpty() and not self.locked:
+            return
+        self.buttons_view.record()
+
+    def setSelection(self, region):
+        if self.locked:
+            return
+
+        rect = QRectF(region["left"], region["top"], region["width"], region["height"])
+        old_rect = self.selected_area.rect()
+        self.selected_area.setRect(rect)
+        self.updateCornerPositions()
+        self.update(self.changedRegion(old_rect, rect))
+        self.buttons_view.update(rect)
+        self.buttons_view.setVisible(True)
+
     def mousePressEvent(self, event: QMouseEvent):
 
         if event.buttons() == Qt.MouseButton.LeftButton:
@@ -180,11 +305,31 @@ class MainWindow(wgs.QWidget):
 
     def mouseMoveEvent(self, event: QMouseEvent):
 
-        current_pos = QPointF(event.pos())
+        self.buttons_view.setVisible(False)
+
+        # The first move goes through right away, later ones wait for the
+        # next refresh and only the latest of them counts
+        self.pending_pos = QPointF(event.pos())
+        if not self.move_timer.isActive():
+            self.applyMove()
+            self.move_timer.start()
+
+        super().mouseMoveEvent(event)
+
+    def moveTimeout(self):
+        if self.pending_pos is not None:
+            self.applyMove()
+            self.move_timer.start()
+
+    def applyMove(self):
+        if self.pending_pos is None:
+            return
+
+        current_pos = self.pending_pos
+        self.pending_pos = None
         corner = self.clicked_corner
         rect = self.selected_area.rect()
-
-        self.buttons_view.setVisible(False)
+        old_rect = self.selected_area.rect()
 
         if corner and rect:
 
@@ -205,23 +350,22 @@ class MainWindow(wgs.QWidget):
             elif corner.index == 7:
                 rect.setLeft(current_pos.x())
 
-            self.selected_area.setRect(rect.normalized())
-            self.updateCornerPositions()
-            self.update()
-
         else:
             rect = QRectF()
             rect.setTopLeft(QPointF(self.start_pos))
             rect.setBottomRight(QPointF(current_pos))
 
-            self.selected_area.setRect(rect.normalized())
-            self.updateCornerPositions()
-            self.update()
-
-        super().mouseMoveEvent(event)
+        self.selected_area.setRect(rect.normalized())
+        self.updateCornerPositions()
+        self.update(self.changedRegion(old_rect, self.selected_area.rect()))
 
     def mouseReleaseEvent(self, event: QMouseEvent):
 
+        # The last move may still be waiting for the timer
+        self.move_timer.stop()
+        self.applyMove()
+        self.repaint_times.report()
+
         width = self.selected_area.rect().width()
         height = self.selected_area.rect().height()
 
@@ -311,8 +455,33 @@ os.environ["QT_ENABLE_HIGHDPI_SCALING"] = "0"
 if __name__ == '__main__':
 
     app = wgs.QApplication(sys.argv)
+    resident = "--resident" in sys.argv
+
+    # Opening the app again only brings up the overlay of the running one
+    if not resident and "--startup-time" not in sys.argv:
+        try:
+            sendCommand("show")
+            sys.exit(0)
+        except ConnectionError:
+            pass
+
     app.setStyle("Fusion")
     app.setQuitOnLastWindowClosed(False)
-    mw = MainWindow()
-    mw.show()
+    service = CaptureService()
+    mw = MainWindow(service, resident)
+
+    # Scripts and hotkey helpers drive recordings through the same service
+    # as the overlay, see gifcapture_control.py
+    server = ControlServer(service)
+    server.showRequested.connect(mw.showOverlay)
+    server.quitRequested.connect(mw.quitApp)
+    if not server.listen():
+        print("Another GifCapture is already listening for commands")
+
+    if resident:
+        # Capture and encoding are loaded and the grabber opened up front,
+        # the overlay only shows when asked to
+        service.warmUp()
+    else:
+        mw.show()
     app.exec()
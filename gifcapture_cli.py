@@ -0,0 +1,162 @@
+import argparse
+import json
+import signal
+import sys
+import threading
+import time
+import mss
+from scripts.backends import MssBackend, RecordBackend, ReplayBackend
+from scripts.recorder import Recorder, RecordingOptions
+from scripts.formats import FORMATS, MP4_PRESETS, formatFromPath
+from scripts.palette import DITHER_MODES
+
+
+def parseRegion(text):
+    try:
+        left, top, width, height = (int(value) for value in text.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "region must be LEFT,TOP,WIDTH,HEIGHT")
+
+    return {"left": left, "top": top, "width": width, "height": height}
+
+
+def parseArguments(argv):
+    defaults = RecordingOptions()
+
+    parser = argparse.ArgumentParser(
+        description="Record a screen region to a GIF (or WebP, APNG, MP4) without the overlay.")
+    parser.add_argument("-o", "--output", required=True,
+                        help="path of the animation to write")
+    parser.add_argument("--format", choices=FORMATS,
+                        help="output format, defaults to the one of the output's extension")
+    parser.add_argument("--region", type=parseRegion,
+                        help="LEFT,TOP,WIDTH,HEIGHT, defaults to the primary monitor")
+    parser.add_argument("--duration", type=float,
+                        help="seconds to record, records until SIGINT/SIGTERM if omitted")
+    parser.add_argument("--fps", type=int, default=defaults.fps)
+    parser.add_argument("--scale", type=float, default=defaults.scale)
+    parser.add_argument("--resample", default=defaults.resample,
+                        choices=["nearest", "box", "bilinear", "bicubic", "lanczos"])
+    parser.add_argument("--lossy", type=int, default=defaults.lossiness,
+                        help="lossiness of the optimizer")
+    parser.add_argument("--colors", type=int, default=defaults.colors)
+    parser.add_argument("--no-optimize", action="store_true")
+    parser.add_argument("--optimizer", default=defaults.optimizer,
+                        choices=["gifsicle", "builtin"])
+    parser.add_argument("--segments", type=int, default=defaults.segments,
+                        help="frame ranges gifsicle optimizes in parallel. With "
+                             "--lossy, frames at segment boundaries come out "
+                             "differently than from a single gifsicle run")
+    parser.add_argument("--dither", default=defaults.dither, choices=DITHER_MODES,
+                        help="ordered dithering stays the same from frame to frame, "
+                             "so it compresses far better than error diffusion")
+    parser.add_argument("--no-transparency", action="store_true",
+                        help="draw unchanged pixels again instead of leaving them transparent")
+    parser.add_argument("--target-size", type=float, default=0, metavar="MB",
+                        help="pick scale, fps, colors and lossiness so the GIF fits "
+                             "under this size, encoding after recording")
+    parser.add_argument("--no-streaming", action="store_true",
+                        help="encode after recording instead of during it")
+    parser.add_argument("--storage", default=defaults.storage,
+                        choices=["memory", "temp", "save"])
+    parser.add_argument("--workers", type=int, default=defaults.workers)
+    parser.add_argument("--webp-quality", type=int, default=defaults.webp_quality,
+                        help="0-100, 100 is lossless")
+    parser.add_argument("--webp-method", type=int, default=defaults.webp_method,
+                        help="0 (fast) to 6 (small)")
+    parser.add_argument("--apng-colors", type=int, default=defaults.apng_colors,
+                        help="colors of the shared palette, 0 keeps full color")
+    parser.add_argument("--apng-compression", type=int, default=defaults.apng_compression,
+                        help="0 (fast) to 9 (small)")
+    parser.add_argument("--crf", type=int, default=defaults.mp4_crf,
+                        help="MP4 quality, 0 (lossless) to 51 (smallest)")
+    parser.add_argument("--preset", default=defaults.mp4_preset, choices=MP4_PRESETS,
+                        help="MP4 encoding speed")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="lower fps and scale while the pipeline can't keep up")
+    parser.add_argument("--replay",
+                        help="replay a raw dump or a directory of images instead of the screen")
+    parser.add_argument("--replay-fast", action="store_true",
+                        help="replay one frame per grab instead of at the original timing")
+    parser.add_argument("--replay-fps", type=float, default=15,
+                        help="timing of replayed image directories")
+    parser.add_argument("--record-raw",
+                        help="also write the raw frames to this dump for later replay")
+    parser.add_argument("--stats-file",
+                        help="write live metrics as JSON lines to this file")
+    parser.add_argument("--json", action="store_true",
+                        help="print the stats as JSON")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parseArguments(argv)
+
+    region = args.region
+    if args.replay:
+        # Replayed frames bring their own size
+        backend = ReplayBackend(args.replay, not args.replay_fast, args.replay_fps)
+        region = region or {"left": 0, "top": 0, "width": 0, "height": 0}
+    else:
+        backend = MssBackend()
+        if region is None:
+            with mss.mss() as sct:
+                region = dict(sct.monitors[1])
+
+    if args.record_raw:
+        backend = RecordBackend(backend, args.record_raw)
+
+    options = RecordingOptions(
+        fps=args.fps,
+        scale=args.scale,
+        resample=args.resample,
+        optimize=not args.no_optimize,
+        optimizer=args.optimizer,
+        lossiness=args.lossy,
+        colors=args.colors,
+        segments=args.segments,
+        streaming=not args.no_streaming,
+        transparency=not args.no_transparency,
+        dither=args.dither,
+        target_size=args.target_size,
+        storage=args.storage,
+        workers=args.workers,
+        adaptive=args.adaptive,
+        format=args.format or formatFromPath(args.output),
+        webp_quality=args.webp_quality,
+        webp_method=args.webp_method,
+        apng_colors=args.apng_colors,
+        apng_compression=args.apng_compression,
+        mp4_crf=args.crf,
+        mp4_preset=args.preset,
+        stats_file=args.stats_file,
+    )
+
+    # Stop after the duration, or when asked to by a signal
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    deadline = None
+    if args.duration is not None:
+        deadline = time.perf_counter() + args.duration
+
+    def shouldStop():
+        return stop.is_set() or (deadline is not None and time.perf_counter() >= deadline)
+
+    recorder = Recorder(region, args.output, options, backend)
+    stats = recorder.run(shouldStop)
+
+    if args.json:
+        print(json.dumps(stats))
+    else:
+        for name, value in stats.items():
+            print(f"{name:>16}: {value}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import argparse
+import json
+import sys
+from scripts.control import COMMANDS, sendCommand
+
+
+def parseRegion(text):
+    try:
+        left, top, width, height = (int(value) for value in text.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "region must be LEFT,TOP,WIDTH,HEIGHT")
+
+    return {"left": left, "top": top, "width": width, "height": height}
+
+
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(
+        description="Control a running GifCapture, for scripts and hotkey helpers. "
+                    "Start the app with --resident to keep it ready in the background.")
+    parser.add_argument("command", choices=COMMANDS)
+    parser.add_argument("--region", type=parseRegion,
+                        help="LEFT,TOP,WIDTH,HEIGHT for start and region, "
+                             "start defaults to the last one")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parseArguments(argv)
+
+    arguments = {}
+    if args.region:
+        arguments["region"] = args.region
+
+    try:
+        reply = sendCommand(args.command, **arguments)
+    except ConnectionError as error:
+        print(error, file=sys.stderr)
+        return 2
+
+    print(json.dumps(reply))
+    return 0 if reply["ok"] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# Lowest the controller goes, and how far it moves per step
+MIN_FPS = 5
+MIN_SCALE = 0.25
+FPS_STEP = 0.75
+SCALE_STEP = 0.75
+
+# Share of the frame budget a stage may use before it counts as overloaded,
+# and what a step up may be expected to use at most
+BUSY_LOAD = 0.9
+HEADROOM_LOAD = 0.6
+
+# Calm metric windows needed before stepping back up
+CALM_WINDOWS = 3
+
+
+# Lowers the capture fps or scale when the pipeline can't keep up with the
+# frame budget, and raises them back once there is headroom. It works from
+# the live metrics snapshots: when grabbing is the slow part only a lower fps
+# helps, when conversion is, a lower scale may. Frames keep the configured
+# output size, so a lower scale only makes conversion cheaper when frames are
+# resized anyway: at full scale they are copied, which beats any resize, and
+# below it the stretch back eats part of the saving. The scale lever is only
+# used at a configured scale below 1, and only while the convert times
+# measured after each step down show it helps. The configured fps and scale
+# are never exceeded.
+class AdaptiveController:
+
+    def __init__(self, fps, scale, workers=1, queue_size=8):
+        self.max_fps = fps
+        self.max_scale = scale
+        self.min_fps = min(MIN_FPS, fps)
+        self.min_scale = scale if scale >= 1 else min(MIN_SCALE, scale)
+        self.workers = max(workers, 1)
+        self.queue_size = queue_size
+
+        self.fps = fps
+        self.scale = scale
+        self.calm = 0
+        self.late = 0
+        self.frames = 0
+
+        # (time, fps, scale, reason) of every change
+        self.changes = []
+
+        # Convert time at each scale stepped down to, relative to the scale
+        # it came from, and whether that ever made conversion cheaper
+        self.ratios = {}
+        self.scale_helps = True
+
+        # Convert ms per frame of the last measured window, the scale and
+        # convert ms before the last step down, and whether the window since
+        # the last change is the first
+        self.convert_ms = 0
+        self.stepped = None
+        self.measured = True
+
+    def update(self, snapshot, timestamp):
+        # Returns the reason if fps or scale changed
+        budget = 1000 / self.fps
+        grab = snapshot["grab_ms"] / budget
+        convert = snapshot["convert_ms"] / self.workers / budget
+
+        late = snapshot["late"] - self.late
+        frames = snapshot["frames"] - self.frames
+        self.late = snapshot["late"]
+        self.frames = snapshot["frames"]
+        backlog = snapshot["queue_depth"] >= max(self.queue_size // 2, 1)
+
+        # The window after a change mixes two settings, wait for one that
+        # shows how the change worked out
+        if not self.measured:
+            self.measured = True
+            return None
+        self.measure(snapshot["convert_ms"])
+
+        # A lower scale doesn't make grabbing any faster
+        if grab > BUSY_LOAD:
+            return self.lower("grab", ["fps"], timestamp)
+        if convert > BUSY_LOAD or backlog:
+            return self.lower("convert", ["scale", "fps"], timestamp)
+        if late > frames * 0.1:
+            return self.lower("late", ["fps", "scale"], timestamp)
+
+        self.calm += 1
+        if late or self.calm < CALM_WINDOWS:
+            return None
+
+        # Scale comes back first, and only if the step is expected to fit
+        if self.scale < self.max_scale:
+            scale = min(self.scale / SCALE_STEP, self.max_scale)
+            if convert / self.ratios.get(round(self.scale, 3), 1) < HEADROOM_LOAD:
+                return self.change(self.fps, scale, "headroom", timestamp)
+        elif self.fps < self.max_fps:
+            fps = min(round(self.fps / FPS_STEP), self.max_fps)
+            if max(grab, convert) * fps / self.fps < HEADROOM_LOAD:
+                return self.change(fps, self.scale, "headroom", timestamp)
+
+        return None
+
+    def lower(self, reason, knobs, timestamp):
+        # Steps down the first of knobs that isn't at its minimum yet
+        self.calm = 0
+        for knob in knobs:
+            if knob == "fps" and self.fps > self.min_fps:
+                fps = max(round(self.fps * FPS_STEP), self.min_fps)
+                return self.change(fps, self.scale, reason, timestamp)
+            if knob == "scale" and not self.scale_helps:
+                # Lowering the scale made conversion slower, take it back
+                if self.scale < self.max_scale:
+                    scale = min(self.scale / SCALE_STEP, self.max_scale)
+                    return self.change(self.fps, scale, reason, timestamp)
+            elif knob == "scale" and self.scale > self.min_scale:
+                scale = max(self.scale * SCALE_STEP, self.min_scale)
+                return self.change(self.fps, scale, reason, timestamp)
+
+        return None
+
+    def measure(self, convert_ms):
+        # Compares the first window after a step down to the one before it
+        if self.stepped and self.stepped[1]:
+            ratio = convert_ms / self.stepped[1]
+            self.ratios[round(self.scale, 3)] = ratio
+            if ratio >= 1:
+                self.scale_helps = False
+        self.stepped = None
+        self.convert_ms = convert_ms
+
+    def change(self, fps, scale, reason, timestamp):
+        self.stepped = (self.scale, self.convert_ms) if scale < self.scale else None
+        self.fps = fps
+        self.scale = scale
+        self.calm = 0
+        self.measured = False
+        self.changes.append({"time": round(timestamp, 3), "fps": fps,
+                             "scale": round(scale, 3), "reason": reason})
+        return reason
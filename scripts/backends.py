@@ -0,0 +1,191 @@
+import json
+import mmap
+import os
+import time
+import mss
+from PIL import Image
+
+
+# Where frames come from. open() starts capturing region, grabInto() returns
+# the next frame as BGRA bytes (in buffer if the backend can fill one, or in
+# a buffer of its own) or None when there are no more frames, and close()
+# releases the source. Backends that can't fill a buffer say so with
+# fills_buffer, and are not given one.
+class CaptureBackend:
+
+    size = None
+    fills_buffer = True
+
+    def open(self, region):
+        raise NotImplementedError
+
+    def grabInto(self, buffer=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# Grabs the screen with mss. With keep_open, the mss handle stays open after
+# close() for the next recording, on the same thread. mss allocates the pixels
+# of every grab itself and has no way to be given a buffer, so each grab
+# returns its own.
+class MssBackend(CaptureBackend):
+
+    fills_buffer = False
+
+    def __init__(self, keep_open=False):
+        self.sct = None
+        self.region = None
+        self.keep_open = keep_open
+
+    def connect(self):
+        if self.sct is None:
+            self.sct = mss.mss()
+
+    def open(self, region):
+        self.connect()
+        self.region = region
+        self.size = (region["width"], region["height"])
+
+    def grabInto(self, buffer=None):
+        return self.sct.grab(self.region).raw
+
+    def close(self):
+        if self.sct and not self.keep_open:
+            self.sct.close()
+            self.sct = None
+
+
+def dumpIndexPath(path):
+    return path + ".json"
+
+
+# Wraps another backend and writes every frame it grabs, with its timing, to a
+# raw dump that ReplayBackend can play back later
+class RecordBackend(CaptureBackend):
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.fills_buffer = backend.fills_buffer
+        self.path = path
+        self.file = None
+        self.timestamps = []
+
+    def open(self, region):
+        self.backend.open(region)
+        self.size = self.backend.size
+        self.file = open(self.path, "wb")
+        self.start = time.perf_counter()
+
+    def grabInto(self, buffer=None):
+        raw = self.backend.grabInto(buffer)
+        if raw is not None:
+            self.timestamps.append(time.perf_counter() - self.start)
+            self.file.write(raw)
+        return raw
+
+    def close(self):
+        self.backend.close()
+        if self.file:
+            self.file.close()
+            self.file = None
+
+            with open(dumpIndexPath(self.path), "w") as index:
+                json.dump({"size": self.size, "timestamps": self.timestamps}, index)
+
+
+# Plays back a raw dump from RecordBackend, or a directory of images, in place
+# of the screen. In realtime mode a grab returns the frame that was on screen
+# at that point of the original recording, otherwise frames come one per grab
+# as fast as they are asked for.
+class ReplayBackend(CaptureBackend):
+
+    IMAGE_TYPES = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+
+    def __init__(self, path, realtime=True, fps=15):
+        self.path = path
+        self.realtime = realtime
+        self.fps = fps
+        self.map = None
+        self.file = None
+        self.index = 0
+
+    def open(self, region):
+        if os.path.isdir(self.path):
+            self.images = sorted(
+                os.path.join(self.path, name) for name in os.listdir(self.path)
+                if name.lower().endswith(self.IMAGE_TYPES))
+            if not self.images:
+                raise ValueError(f"No images to replay in {self.path}")
+
+            self.timestamps = [index / self.fps for index in range(len(self.images))]
+            with Image.open(self.images[0]) as first:
+                self.size = first.size
+        else:
+            self.images = None
+            with open(dumpIndexPath(self.path)) as index:
+                info = json.load(index)
+
+            self.size = tuple(info["size"])
+            self.timestamps = info["timestamps"]
+            self.file = open(self.path, "rb")
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # How long the last frame stays up
+        self.hold = 1 / self.fps
+        if len(self.timestamps) > 1:
+            self.hold = self.timestamps[-1] - self.timestamps[-2]
+
+        self.frame_bytes = self.size[0] * self.size[1] * 4
+        self.index = 0
+        self.start = time.perf_counter()
+
+    def grabInto(self, buffer=None):
+        if self.realtime:
+            # Latest frame at this point of the original timing
+            elapsed = time.perf_counter() - self.start
+            if elapsed > self.timestamps[-1] + self.hold:
+                return None
+            while self.index + 1 < len(self.timestamps) \
+                    and self.timestamps[self.index + 1] <= elapsed:
+                self.index += 1
+        elif self.index >= len(self.timestamps):
+            return None
+
+        index = self.index
+        if not self.realtime:
+            self.index += 1
+
+        return self.readFrame(index, buffer)
+
+    def readFrame(self, index, buffer):
+        if self.images:
+            with Image.open(self.images[index]) as image:
+                image = image.convert("RGBA")
+                if image.size != self.size:
+                    image = image.resize(self.size)
+                data = image.tobytes("raw", "BGRA")
+        else:
+            start = index * self.frame_bytes
+            data = memoryview(self.map)[start:start + self.frame_bytes]
+
+        if buffer is None:
+            return bytearray(data)
+
+        buffer[:] = data
+        return buffer
+
+    def close(self):
+        if self.map:
+            self.map.close()
+            self.map = None
+        if self.file:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,160 @@
+import threading
+import time
+from PyQt6.QtCore import Qt, QSize, QTimer, QUrl, pyqtSignal
+from PyQt6.QtGui import QDesktopServices, QIcon, QPixmap
+import PyQt6.QtWidgets as wgs
+from scripts.library import Library
+from scripts.thumbnails import ThumbnailCache, THUMBNAIL_SIZE, STRIP_FPS
+
+
+FONT_SIZE = "10pt"
+
+PATH_ROLE = Qt.ItemDataRole.UserRole
+STRIP_ROLE = Qt.ItemDataRole.UserRole + 1
+
+
+# The saved recordings, newest first, with their thumbnails. The selected
+# one plays its preview strip. Thumbnails come from the cache on a
+# background thread, so recordings saved without one don't hold up the
+# window while they are decoded.
+class LibraryWindow(wgs.QDialog):
+
+    # (row, (thumbnail path, strip path) or None), from the loading thread
+    previewReady = pyqtSignal(int, object)
+
+    def __init__(self, directory):
+        super().__init__()
+
+        self.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        self.setWindowTitle("GIF Library")
+        self.setMinimumSize(800, 600)
+        self.setStyleSheet(f"font-size: {FONT_SIZE}")
+
+        self.directory = directory
+        self.library = Library(directory)
+        self.cache = ThumbnailCache.fromSettings(directory)
+        self.entries = self.library.find()
+
+        # Recordings
+        self.list = wgs.QListWidget()
+        self.list.setViewMode(wgs.QListView.ViewMode.IconMode)
+        self.list.setResizeMode(wgs.QListView.ResizeMode.Adjust)
+        self.list.setMovement(wgs.QListView.Movement.Static)
+        self.list.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.list.setGridSize(QSize(THUMBNAIL_SIZE + 20, THUMBNAIL_SIZE + 40))
+        self.list.setUniformItemSizes(True)
+        self.list.currentItemChanged.connect(self.showPreview)
+        self.list.itemDoubleClicked.connect(self.openItem)
+
+        for entry in self.entries:
+            item = wgs.QListWidgetItem(entry["name"])
+            item.setData(PATH_ROLE, self.library.filePath(entry))
+            item.setToolTip(self.describe(entry))
+            self.list.addItem(item)
+
+        # Preview of the selected recording
+        self.preview = wgs.QLabel()
+        self.preview.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.preview.setFixedHeight(THUMBNAIL_SIZE * 2)
+        self.strip = None
+        self.strip_frames = 0
+        self.strip_frame = 0
+        self.timer = QTimer(self)
+        self.timer.setInterval(round(1000 / STRIP_FPS))
+        self.timer.timeout.connect(self.nextFrame)
+
+        # Footer
+        folder = wgs.QPushButton("Open folder")
+        folder.clicked.connect(self.openFolder)
+        close = wgs.QPushButton("Close")
+        close.clicked.connect(self.close)
+        self.count = wgs.QLabel(f"{len(self.entries)} recordings")
+
+        footer = wgs.QHBoxLayout()
+        footer.addWidget(self.count)
+        footer.addStretch(1)
+        footer.addWidget(folder)
+        footer.addWidget(close)
+
+        layout = wgs.QVBoxLayout()
+        layout.addWidget(self.preview)
+        layout.addWidget(self.list, 1)
+        layout.addItem(footer)
+        self.setLayout(layout)
+
+        self.loading = True
+        self.previewReady.connect(self.setPreview)
+        threading.Thread(target=self.loadPreviews, daemon=True).start()
+
+    def describe(self, entry):
+        lines = [time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["created"]))]
+        if entry["size"] is not None:
+            lines.append(f"{entry['size'] / 1048576:.1f} MB")
+        if entry["frames"] is not None:
+            lines.append(f"{entry['frames']} frames, {entry['duration']} s")
+        return "\n".join(lines)
+
+    def loadPreviews(self):
+        # Runs on its own thread, with one connection to the cache for the
+        # whole pass
+        with self.cache:
+            for row, entry in enumerate(self.entries):
+                if not self.loading:
+                    return
+                try:
+                    paths = self.cache.preview(self.library.filePath(entry))
+                except OSError as error:
+                    print(error)
+                    paths = None
+                if self.loading:
+                    self.previewReady.emit(row, paths)
+
+    def setPreview(self, row, paths):
+        if not paths:
+            return
+
+        item = self.list.item(row)
+        item.setIcon(QIcon(paths[0]))
+        item.setData(STRIP_ROLE, paths)
+        if item is self.list.currentItem():
+            self.showPreview(item)
+
+    def showPreview(self, item, previous=None):
+        self.timer.stop()
+        self.strip = None
+        self.preview.clear()
+
+        paths = item.data(STRIP_ROLE) if item else None
+        if not paths:
+            return
+
+        # The strip is frames of the thumbnail's width side by side
+        width = QPixmap(paths[0]).width()
+        self.strip = QPixmap(paths[1])
+        self.strip_frames = max(round(self.strip.width() / width), 1) if width else 1
+        self.strip_frame = -1
+        self.nextFrame()
+        self.timer.start()
+
+    def nextFrame(self):
+        if self.strip is None:
+            return
+
+        self.strip_frame = (self.strip_frame + 1) % self.strip_frames
+        width = self.strip.width() // self.strip_frames
+        frame = self.strip.copy(self.strip_frame * width, 0, width, self.strip.height())
+        self.preview.setPixmap(frame.scaled(
+            self.preview.width(), self.preview.height(),
+            Qt.AspectRatioMode.KeepAspectRatio,
+            Qt.TransformationMode.SmoothTransformation))
+
+    def openItem(self, item):
+        QDesktopServices.openUrl(QUrl.fromLocalFile(item.data(PATH_ROLE)))
+
+    def openFolder(self):
+        QDesktopServices.openUrl(QUrl.fromLocalFile(self.directory))
+
+    def closeEvent(self, event):
+        self.loading = False
+        self.timer.stop()
+        return super().closeEvent(event)
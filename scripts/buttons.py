@@ -1,12 +1,15 @@
 from enum import Enum
 import os
-from PyQt6.QtCore import QPoint, QThread, QSize, QMimeData, QBuffer, QByteArray, QIODevice, QUrl
+from PyQt6.QtCore import QPoint, QSize, QMimeData, QBuffer, QByteArray, QIODevice, QUrl
 from PyQt6.QtGui import QIcon, QMovie, QGuiApplication, QImage
 import PyQt6.QtWidgets as wgs
-from scripts.settings import SettingWindow
-from scripts.thread import GifThread
+from scripts.jobs import ENCODING, DONE, FAILED
 import scripts.saved as settings
-import imageio
+import scripts.service as service
+
+# Capture, encoding, the library and the settings dialog pull in numpy, PIL,
+# mss and imageio. They are imported when first used, so the overlay shows
+# without waiting for them.
 
 
 class ProgramState(Enum):
@@ -37,15 +40,8 @@ class Button(wgs.QPushButton):
             }
         """)
 
-        # For loading
+        # Shows the loading animation instead of its icons while set
         self.isLoading = False
-        self.loadingGif = QMovie("data/icons/loading.gif")
-        self.loadingGif.start()
-        self.loadingGif.frameChanged.connect(self.updateLoading)
-
-    def updateLoading(self):
-        if self.isLoading:
-            self.setIcon(QIcon(self.loadingGif.currentPixmap()))
 
     def setDisabled(self, value):
         self.is_disabled = value
@@ -74,19 +70,18 @@ class Buttons(wgs.QGraphicsView):
 
         if state is ProgramState.IDLE:
             # Record Button
-            self.record_button.regular_icon = QIcon("data/icons/record.png")
-            self.record_button.hovered_icon = QIcon(
-                "data/icons/hover_record.png")
-            self.record_button.setIcon(QIcon("data/icons/record.png"))
+            self.record_button.regular_icon, self.record_button.hovered_icon = \
+                self.record_icons[state]
+            self.record_button.setIcon(self.record_button.regular_icon)
             self.record_button.setToolTip("Start recording area")
 
         elif state is ProgramState.RECORDING:
             # Record Button
-            self.record_button.regular_icon = QIcon("data/icons/recording.png")
-            self.record_button.hovered_icon = QIcon(
-                "data/icons/hover_recording.png")
-            self.record_button.setIcon(QIcon("data/icons/recording.png"))
+            self.record_button.regular_icon, self.record_button.hovered_icon = \
+                self.record_icons[state]
+            self.record_button.setIcon(self.record_button.regular_icon)
             self.record_button.setToolTip("Stop recording")
+            self.metrics_label.setText("")
 
         elif state is ProgramState.LOADING:
 
@@ -94,21 +89,66 @@ class Buttons(wgs.QGraphicsView):
             self.record_button.isLoading = True
             self.record_button.setToolTip("Saving...")
 
+        # The animation only runs while it is shown
+        if state is ProgramState.LOADING:
+            self.loading.start()
+        else:
+            self.loading.stop()
+
+        self.metrics_label.setVisible(state is ProgramState.RECORDING)
         self.mainwindow.update()
 
+    def updateLoading(self):
+        if self.record_button.isLoading:
+            self.record_button.setIcon(QIcon(self.loading.currentPixmap()))
+
+    def showMetrics(self, metrics):
+        # Only the label repaints, not the overlay
+        size = metrics["estimated_size"] or metrics["bytes_written"] \
+            or metrics["bytes_buffered"]
+        dropped = metrics["dropped"] + metrics["queue_dropped"]
+        self.metrics_label.setText(
+            f"{metrics['fps']:.1f} fps\n{dropped} dropped\n{size / 1048576:.1f} MB")
+        self.metrics_label.setToolTip(
+            f"Grab: {metrics['grab_ms']} ms\n"
+            f"Convert: {metrics['convert_ms']} ms\n"
+            f"Queue: {metrics['queue_depth']}")
+
+    def showJobs(self, job):
+        jobs = self.service.jobs.jobs()
+        encoding = sum(1 for queued in jobs if queued.status is ENCODING)
+        waiting = len(jobs) - encoding
+
+        if job.status is DONE:
+            print(f"Saved {job.name}")
+        elif job.status is FAILED:
+            print(f"Saving {job.name} failed: {job.error}")
+
+        if jobs:
+            text = f"Saving {encoding}"
+            if waiting:
+                text += f"\n{waiting} queued"
+        elif job.status is DONE:
+            text = f"Saved\n{job.name}"
+        elif job.status is FAILED:
+            text = f"Failed\n{job.name}"
+        else:
+            text = ""
+
+        self.jobs_label.setText(text)
+        self.jobs_label.setToolTip("\n".join(
+            f"{queued.name}: {queued.status}" for queued in jobs))
+        self.jobs_label.setVisible(bool(text))
+
     def record(self):
 
-        if self.state is ProgramState.RECORDING:
+        if self.service.state == service.RECORDING:
             # Stop Recoring if we are already recording
             print("Stop!")
-            if (self.worker):
-                self.worker.stop.emit()
-                self.worker.deleteLater()
+            self.service.stop()
 
-        else:
-            self.mainwindow.lockTransform(True)
+        elif self.service.state == service.IDLE:
             print("Started")
-            self.updateState(ProgramState.RECORDING)
 
             rect = self.mainwindow.selected_area.rect()
 
@@ -120,29 +160,18 @@ class Buttons(wgs.QGraphicsView):
             region = {"left": left, "top": top,
                       "width": width, "height": height}
 
-            # Create and start the screenshot thread
-            self.thread = QThread()
-            self.worker = GifThread(region)
-            self.worker.moveToThread(self.thread)
-            self.thread.started.connect(self.worker.run)
-            self.worker.stop.connect(self.stop_recording)
-            self.worker.startSaving.connect(self.start_saving)
-            self.worker.finished.connect(self.finished_recording)
-            self.worker.finished.connect(self.worker.deleteLater)
-            self.worker.finished.connect(self.thread.quit)
-            self.thread.finished.connect(self.thread.deleteLater)
-            self.thread.start()
-
-    def stop_recording(self):
-        if (self.worker):
-            self.worker.stopped = True
-
-    def start_saving(self):
-        self.updateState(ProgramState.LOADING)
-
-    def finished_recording(self):
-        self.mainwindow.lockTransform(False)
-        self.updateState(ProgramState.IDLE)
+            self.service.start(region)
+
+    def serviceStateChanged(self, state):
+        # Recordings started over the control socket show up here too
+        if state == service.RECORDING:
+            self.mainwindow.lockTransform(True)
+            self.updateState(ProgramState.RECORDING)
+        elif state == service.SAVING:
+            self.updateState(ProgramState.LOADING)
+        else:
+            self.mainwindow.lockTransform(False)
+            self.updateState(ProgramState.IDLE)
 
     def close(self):
         self.mainwindow.closeApp()
@@ -160,20 +189,29 @@ class Buttons(wgs.QGraphicsView):
         if not os.path.exists(file_path):
             os.mkdir(file_path)
 
-        os.startfile(file_path)
+        from scripts.browser import LibraryWindow
+        self.library_window = LibraryWindow(file_path)
+        self.library_window.show()
 
     def openSettings(self):
+        from scripts.settings import SettingWindow
 
         settings_dialog = SettingWindow()
         settings_dialog.exec()
 
+        self.service.configure()
+        self.mainwindow.updateShortcut()
+
     def copy(self):
+        from scripts.library import Library
 
-        file_path = settings.GlobalSettings.value(
-            settings.SETTING_SAVEDIRECTORY, settings.defaultDirectory)
+        library = Library(settings.GlobalSettings.value(
+            settings.SETTING_SAVEDIRECTORY, settings.defaultDirectory))
 
-        file_list = os.listdir(file_path)
-        last_file = os.path.join(file_path, file_list[-1])
+        latest = library.latest()
+        if latest is None:
+            return
+        last_file = library.filePath(latest)
 
         clipboard = QGuiApplication.clipboard()
         clipboard.setImage(QImage(last_file))
@@ -181,6 +219,8 @@ class Buttons(wgs.QGraphicsView):
         print("Copied!")
 
     def save(self):
+        import imageio
+
         file_path, _ = wgs.QFileDialog.getSaveFileName(
             None, "Save GIF", "my_gif.gif", "GIF Files (*.gif)"
         )
@@ -198,6 +238,34 @@ class Buttons(wgs.QGraphicsView):
         self.setGeometry(0, 0, self.tabwidth, self.tabheight)
         self.state = ProgramState.IDLE
 
+        # Live metrics while recording
+        self.metrics_label = wgs.QLabel()
+        self.metrics_label.setStyleSheet("font-size: 8pt")
+        self.metrics_label.setVisible(False)
+
+        # Recordings run and save through the capture service
+        self.service = mainwindow.service
+        self.service.stateChanged.connect(self.serviceStateChanged)
+        self.service.metrics.connect(self.showMetrics)
+        self.service.jobChanged.connect(self.showJobs)
+
+        # Recordings saving in the background
+        self.jobs_label = wgs.QLabel()
+        self.jobs_label.setStyleSheet("font-size: 8pt")
+        self.jobs_label.setVisible(False)
+
+        # Icons of the record button in each state, loaded once
+        self.record_icons = {
+            ProgramState.IDLE: (QIcon("data/icons/record.png"),
+                                QIcon("data/icons/hover_record.png")),
+            ProgramState.RECORDING: (QIcon("data/icons/recording.png"),
+                                     QIcon("data/icons/hover_recording.png")),
+        }
+
+        # One loading animation, for the record button while saving
+        self.loading = QMovie("data/icons/loading.gif")
+        self.loading.frameChanged.connect(self.updateLoading)
+
         # Record Button
         self.record_button = Button(
             "data/icons/record.png", "data/icons/hover_record.png")
@@ -238,6 +306,8 @@ class Buttons(wgs.QGraphicsView):
 
         layout = wgs.QHBoxLayout()
         layout.addWidget(self.record_button)
+        layout.addWidget(self.metrics_label)
+        layout.addWidget(self.jobs_label)
         layout.addWidget(self.settings_button)
         layout.addWidget(self.browse_button)
         layout.addWidget(self.close_button)
@@ -0,0 +1,114 @@
+import json
+from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtNetwork import QLocalServer, QLocalSocket
+
+
+# Name of the local socket (a named pipe on Windows) the app listens on
+SERVER_NAME = "gifcapture-control"
+
+COMMANDS = ["start", "stop", "toggle", "region", "status", "show", "quit"]
+
+
+# Takes commands for the capture service over a local socket, so scripts and
+# hotkey helpers can drive a running app. Requests and replies are JSON
+# objects, one per line: {"command": "start", "region": {...}} gets back
+# {"ok": true, "status": {...}}, or {"ok": false, "error": "..."}.
+class ControlServer(QObject):
+
+    showRequested = pyqtSignal()
+    quitRequested = pyqtSignal()
+
+    def __init__(self, service, name=SERVER_NAME):
+        super().__init__()
+        self.service = service
+        self.name = name
+        self.server = QLocalServer(self)
+        self.server.newConnection.connect(self.accept)
+        self.buffers = {}
+
+    def listen(self):
+        # False if another instance already has the name
+        if self.server.listen(self.name):
+            return True
+
+        # A server that crashed leaves its socket file behind on Unix
+        if isRunning(self.name):
+            return False
+        QLocalServer.removeServer(self.name)
+        return self.server.listen(self.name)
+
+    def accept(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            self.buffers[socket] = b""
+            socket.readyRead.connect(lambda socket=socket: self.read(socket))
+            socket.disconnected.connect(lambda socket=socket: self.drop(socket))
+
+    def drop(self, socket):
+        self.buffers.pop(socket, None)
+        socket.deleteLater()
+
+    def read(self, socket):
+        self.buffers[socket] += bytes(socket.readAll())
+        while b"\n" in self.buffers[socket]:
+            line, self.buffers[socket] = self.buffers[socket].split(b"\n", 1)
+            reply = self.handle(line)
+            socket.write(json.dumps(reply).encode() + b"\n")
+            socket.flush()
+
+    def handle(self, line):
+        try:
+            request = json.loads(line)
+            command = request["command"]
+        except (ValueError, TypeError, KeyError):
+            return {"ok": False, "error": "Expected a JSON object with a command"}
+
+        service = self.service
+        try:
+            if command == "start":
+                service.start(request.get("region"))
+            elif command == "stop":
+                service.stop()
+            elif command == "toggle":
+                service.toggle()
+            elif command == "region":
+                service.setRegion(request.get("region"))
+            elif command == "show":
+                self.showRequested.emit()
+            elif command == "quit":
+                self.quitRequested.emit()
+            elif command != "status":
+                return {"ok": False, "error": f"Unknown command: {command}"}
+        except (RuntimeError, ValueError) as error:
+            return {"ok": False, "error": str(error), "status": service.status()}
+
+        return {"ok": True, "status": service.status()}
+
+
+def sendCommand(command, name=SERVER_NAME, timeout=2000, **arguments):
+    # Sends one command to a running app and returns its reply. Raises
+    # ConnectionError if no app is listening.
+    socket = QLocalSocket()
+    socket.connectToServer(name)
+    if not socket.waitForConnected(timeout):
+        raise ConnectionError(f"GifCapture isn't running ({socket.errorString()})")
+
+    socket.write(json.dumps({"command": command, **arguments}).encode() + b"\n")
+    socket.waitForBytesWritten(timeout)
+
+    reply = b""
+    while not reply.endswith(b"\n"):
+        if not socket.waitForReadyRead(timeout):
+            raise ConnectionError("GifCapture didn't reply")
+        reply += bytes(socket.readAll())
+
+    socket.disconnectFromServer()
+    return json.loads(reply)
+
+
+def isRunning(name=SERVER_NAME):
+    socket = QLocalSocket()
+    socket.connectToServer(name)
+    running = socket.waitForConnected(200)
+    socket.abort()
+    return running
@@ -0,0 +1,46 @@
+import numpy as np
+
+
+# Compares each frame to the previous one. Unchanged frames are dropped (the
+# previous frame is then shown longer), changed ones are cropped to the
+# bounding box of the pixels that changed.
+class FrameDiffer:
+
+    def __init__(self):
+        self.previous = None
+
+        # Comparison buffers, reused while the frame size stays the same
+        self.changed = None
+        self.changed_pixels = None
+
+    def reset(self):
+        self.previous = None
+
+    def update(self, frame):
+        # Returns (frame, offset) to encode, or None for a duplicate. Frames
+        # are (h, w, 3) arrays that are not modified before the next update,
+        # so keeping a reference is enough and crops are views into them.
+        current = np.asarray(frame)
+        previous = self.previous
+        self.previous = current
+
+        if previous is None or previous.shape != current.shape:
+            return current, (0, 0)
+
+        if self.changed is None or self.changed.shape != current.shape:
+            self.changed = np.empty(current.shape, dtype=bool)
+            self.changed_pixels = np.empty(current.shape[:2], dtype=bool)
+
+        changed = np.not_equal(current, previous, out=self.changed)
+        if changed.ndim == 3:
+            changed = np.any(changed, axis=2, out=self.changed_pixels)
+
+        rows = np.flatnonzero(changed.any(axis=1))
+        if rows.size == 0:
+            return None
+
+        cols = np.flatnonzero(changed.any(axis=0))
+        x0, y0 = int(cols[0]), int(rows[0])
+        x1, y1 = int(cols[-1]) + 1, int(rows[-1]) + 1
+
+        return current[y0:y1, x0:x1], (x0, y0)
@@ -0,0 +1,290 @@
+import queue
+import struct
+import threading
+import time
+from PIL import Image, GifImagePlugin
+from scripts.palette import FramePalette, buildPalette
+
+
+# Writes a GIF one frame at a time, so frames can go to disk while recording
+class GifEncoder:
+
+    def __init__(self, path, loop=0):
+        self.path = path
+        self.loop = loop
+        self.file = open(path, "wb")
+        self.size = None
+        self.frames = 0
+
+        # Bytes written so far
+        self.bytes = 0
+
+    def writeHeader(self, size, palette=None):
+        self.size = size
+        flags = 0
+        table = b""
+
+        # Optional global color table, padded to a power of two
+        if palette:
+            bits = max((len(palette) // 3 - 1).bit_length(), 1)
+            table = bytes(palette).ljust(3 << bits, b"\0")
+            flags = 0x80 | (7 << 4) | (bits - 1)
+
+        self.writeData(b"GIF89a" + struct.pack("<HHBBB",
+                       size[0], size[1], flags, 0, 0) + table)
+
+        # Netscape looping extension
+        self.writeData(b"!\xff\x0bNETSCAPE2.0\x03\x01" +
+                       struct.pack("<H", self.loop) + b"\0")
+
+    def write(self, image, duration, offset=(0, 0), local_palette=True, **params):
+        # Image must be in "P" mode, duration is in milliseconds
+        if self.size is None:
+            self.writeHeader(image.size)
+
+        for chunk in GifImagePlugin.getdata(image, offset, duration=duration, interlace=0,
+                                            include_color_table=local_palette, **params):
+            self.writeData(chunk)
+
+        self.frames += 1
+
+    def writeData(self, data):
+        self.file.write(data)
+        self.bytes += len(data)
+
+    def close(self):
+        self.writeData(b";")
+        self.file.close()
+
+
+def quantize(frame, offset=(0, 0), dither="none"):
+    image = Image.fromarray(frame)
+    quantized = image.quantize(256, method=Image.Quantize.FASTOCTREE,
+                               dither=Image.Dither.NONE)
+    if dither == "none":
+        return quantized
+
+    # Pillow only dithers onto a given palette, so map the frame again onto
+    # the one it was just given
+    if dither == "diffusion":
+        return image.quantize(palette=quantized,
+                              dither=Image.Dither.FLOYDSTEINBERG)
+
+    return FramePalette(frame, quantized, dither).map(frame, offset)
+
+
+# Maps frames to palette indices, either with a shared palette or one palette
+# per frame, running them through the optimizer when there is one. A shared
+# palette brings its own dither mode.
+class FrameIndexer:
+
+    def __init__(self, palette=None, optimizer=None, dither="none"):
+        self.palette = palette
+        self.optimizer = optimizer
+        self.dither = dither
+
+        if optimizer:
+            optimizer.start(palette)
+
+    def index(self, frame, offset):
+        # Returns (indexed image, offset) for an (h, w, 3) array, or None
+        # when it can be skipped
+        if self.optimizer:
+            return self.optimizer.optimize(frame, offset)
+
+        if self.palette:
+            return self.palette.map(frame, offset), offset
+
+        return quantize(frame, offset, self.dither), offset
+
+    def write(self, encoder, frame, delay):
+        # Frames are left in place (disposal 1), so cropped frames and their
+        # transparent pixels draw over the previous ones
+        image, offset = frame
+        params = {}
+
+        if self.optimizer:
+            table = self.optimizer.paletteBytes()
+            params["transparency"] = self.optimizer.transparent
+        elif self.palette:
+            table = self.palette.bytes()
+
+        if encoder.size is None and self.palette:
+            encoder.writeHeader(image.size, table)
+
+        encoder.write(image, delay, offset, local_palette=self.palette is None,
+                      disposal=1, **params)
+
+
+def writeFrames(path, frames, delays, palette=None, optimizer=None, writer=None,
+                dither="none"):
+    # Encodes (array, offset) frames one at a time, so frames can be an
+    # iterator that loads them lazily (e.g. from a FrameSpool). A writer from
+    # scripts.formats replaces the GIF encoding.
+    encoder = writer or GifEncoder(path)
+    indexer = writer or FrameIndexer(palette, optimizer, dither)
+    return encodeFrames(encoder, indexer, frames, delays)
+
+
+def encodeFrames(encoder, indexer, frames, delays):
+    # Indexes and writes frames with their delays, then closes the encoder
+    pending = None
+    for (array, offset), delay in zip(frames, delays):
+        frame = indexer.index(array, offset)
+
+        # Nothing changed, show the previous frame for longer
+        if frame is None:
+            if pending:
+                pending[1] += delay
+            continue
+
+        if pending:
+            indexer.write(encoder, *pending)
+        pending = [frame, delay]
+
+    if pending:
+        indexer.write(encoder, *pending)
+    encoder.close()
+
+    return encoder.frames
+
+
+# Quantizes and encodes frames on a background thread while they are captured.
+# A frame is written once the next one arrives, since that is when its delay
+# is known. With palette_frames set, the first frames are held back until a
+# global palette has been built from them. A writer from scripts.formats
+# replaces the GIF encoding.
+class StreamingEncoder:
+
+    def __init__(self, path, interval, palette_frames=0, optimizer=None, colors=256,
+                 writer=None, dither="none"):
+        self.encoder = writer or GifEncoder(path)
+        self.interval = interval
+        self.palette_frames = 0 if writer else palette_frames
+        self.optimizer = optimizer
+        self.colors = optimizer.colors if optimizer else colors
+        self.dither = dither
+        self.indexer = writer
+        if not (writer or palette_frames):
+            self.indexer = FrameIndexer(dither=dither)
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.work, daemon=True)
+
+        # Time spent indexing and writing frames
+        self.encode_time = 0
+
+        # Frames and bytes added and encoded so far. Each is only changed by
+        # one thread, so they can be read while recording without a lock.
+        self.added = 0
+        self.added_bytes = 0
+        self.encoded = 0
+        self.encoded_bytes = 0
+
+        self.pending = None
+        self.end_time = None
+        self.first_time = None
+        self.last_time = 0
+        self.shown = 0
+
+        # Set when encoding failed, finish() raises it. Frames added after
+        # that are dropped.
+        self.error = None
+
+    def start(self):
+        self.thread.start()
+
+    def add(self, frame, timestamp, offset=(0, 0)):
+        if self.error:
+            return
+
+        self.added += 1
+        self.added_bytes += frame.nbytes
+        self.queue.put((frame, timestamp, offset))
+
+    def buffered(self):
+        # Bytes of frames waiting to be encoded
+        return self.added_bytes - self.encoded_bytes
+
+    def estimatedSize(self):
+        # File size once the frames added so far are encoded, assuming the
+        # waiting frames compress like the encoded ones did
+        if not (self.encoded and self.encoder.bytes):
+            return None
+        return round(self.encoder.bytes * self.added / self.encoded)
+
+    def finish(self, end=None):
+        # Blocks until every queued frame is on disk. The last frame is shown
+        # until end, or for one interval.
+        self.end_time = end
+        self.queue.put(None)
+        self.thread.join()
+
+        if self.error:
+            raise self.error
+
+    def work(self):
+        try:
+            self.encodeAll()
+        except Exception as error:
+            self.error = error
+
+    def encodeAll(self):
+        held = []
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            held.append(item)
+            if self.indexer is None and len(held) < self.palette_frames:
+                continue
+
+            self.encode(held)
+            held = []
+
+        self.encode(held)
+
+        end = self.end_time
+        if end is None or end <= self.last_time:
+            end = self.last_time + self.interval
+        self.push(None, end)
+
+        # Writers that encode everything at the end do it here
+        start = time.perf_counter()
+        self.encoder.close()
+        self.encode_time += time.perf_counter() - start
+
+    def encode(self, items):
+        start = time.perf_counter()
+        self.encodeItems(items)
+        self.encode_time += time.perf_counter() - start
+
+    def encodeItems(self, items):
+        if self.indexer is None and items:
+            palette = buildPalette([array for array, _, _ in items], self.colors,
+                                   self.dither)
+            self.indexer = FrameIndexer(palette, self.optimizer)
+
+        for array, timestamp, offset in items:
+            frame = self.indexer.index(array, offset)
+
+            # Skipped frames extend the previous frame's delay
+            if frame is not None:
+                self.push(frame, timestamp)
+
+            self.encoded += 1
+            self.encoded_bytes += array.nbytes
+
+    def push(self, frame, timestamp):
+        if self.first_time is None:
+            self.first_time = timestamp
+
+        # Delays in centiseconds with the rounding error carried forward
+        if self.pending is not None:
+            end = round((timestamp - self.first_time) * 100)
+            delay = max(end - self.shown, 2)
+            self.shown += delay
+            self.indexer.write(self.encoder, self.pending, delay * 10)
+
+        self.pending = frame
+        self.last_time = timestamp
@@ -0,0 +1,210 @@
+import os
+import numpy as np
+from PIL import Image
+from scripts.palette import buildPalette, sampleFrames
+
+
+FORMATS = ["gif", "webp", "apng", "mp4"]
+
+EXTENSIONS = {
+    "gif": ".gif",
+    "webp": ".webp",
+    "apng": ".png",
+    "mp4": ".mp4",
+}
+
+MP4_PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast",
+               "medium", "slow", "slower", "veryslow"]
+
+
+def ffmpegAvailable():
+    # MP4 is written by imageio's FFMPEG plugin, from imageio[ffmpeg]
+    try:
+        import imageio.v2
+        import imageio_ffmpeg
+        imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        return False
+    return True
+
+
+def formatFromPath(path, default="gif"):
+    extension = os.path.splitext(path)[1].lower()
+    for name, known in EXTENSIONS.items():
+        if extension == known:
+            return name
+    return default
+
+
+# Writes the frames of a recording to a format other than GIF. A writer
+# stands in for both the FrameIndexer and the GifEncoder of the GIF path:
+# index() passes frames through, write() draws the (possibly cropped) frame
+# over what is shown and adds the full picture with its delay in ms.
+class AnimationWriter:
+
+    def __init__(self, path):
+        self.path = path
+        self.canvas = None
+        self.frames = 0
+
+        # Bytes of frames kept in memory until close
+        self.held_bytes = 0
+
+    @property
+    def size(self):
+        if self.canvas is None:
+            return None
+        return self.canvas.shape[1], self.canvas.shape[0]
+
+    @property
+    def bytes(self):
+        # Bytes written so far, 0 for formats written at the end
+        return 0
+
+    def index(self, frame, offset):
+        return frame, offset
+
+    def write(self, encoder, frame, delay):
+        array, offset = frame
+        left, top = offset
+        height, width = array.shape[:2]
+
+        if self.canvas is None:
+            self.canvas = np.array(array)
+        else:
+            self.canvas[top:top + height, left:left + width] = array
+
+        self.writeFrame(self.canvas, delay)
+        self.frames += 1
+
+    def writeFrame(self, canvas, delay):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# Pillow only writes animated WebP and APNG from all frames at once, so these
+# keep the full frames until close
+class HeldFramesWriter(AnimationWriter):
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.held = []
+        self.delays = []
+
+    def writeFrame(self, canvas, delay):
+        self.held.append(Image.fromarray(canvas))
+        self.delays.append(delay)
+        self.held_bytes += canvas.nbytes
+
+    def close(self):
+        if self.held:
+            first, *rest = self.images()
+            first.save(self.path, save_all=True, append_images=rest,
+                       duration=self.delays, loop=0, **self.params())
+        self.held = []
+        self.held_bytes = 0
+
+    def images(self):
+        return self.held
+
+    def params(self):
+        return {}
+
+
+class WebPWriter(HeldFramesWriter):
+
+    def __init__(self, path, quality=80, method=4):
+        # quality 0-100 (100 is lossless), method 0 (fast) to 6 (small)
+        super().__init__(path)
+        self.quality = quality
+        self.method = method
+
+    def params(self):
+        return {"format": "WEBP", "quality": self.quality, "method": self.method,
+                "lossless": self.quality >= 100, "minimize_size": self.method >= 6}
+
+
+class APNGWriter(HeldFramesWriter):
+
+    def __init__(self, path, colors=256, compression=6):
+        # colors 2-256 share one palette, 0 keeps full color. compression
+        # 0 (fast) to 9 (small).
+        super().__init__(path)
+        self.colors = colors
+        self.compression = compression
+
+    def images(self):
+        if not self.colors:
+            return self.held
+
+        frames = [(np.asarray(image), (0, 0)) for image in self.held]
+        palette = buildPalette(sampleFrames(frames, 10), self.colors)
+        return [palette.map(frame) for frame, _ in frames]
+
+    def params(self):
+        return {"format": "PNG", "compress_level": self.compression,
+                "default_image": False}
+
+
+# H.264 through imageio's ffmpeg plugin. Video needs a constant frame rate, so
+# frames are repeated to match their delays at fps.
+class MP4Writer(AnimationWriter):
+
+    def __init__(self, path, fps=15, crf=23, preset="veryfast"):
+        # crf 0 (lossless) to 51 (smallest), preset ultrafast to veryslow
+        if not ffmpegAvailable():
+            raise RuntimeError("MP4 output needs pip install imageio[ffmpeg]")
+
+        super().__init__(path)
+        self.fps = fps
+        self.crf = crf
+        self.preset = preset
+        self.video = None
+        self.shown = 0
+        self.time = 0
+
+    @property
+    def bytes(self):
+        if self.video is None or not os.path.exists(self.path):
+            return 0
+        return os.path.getsize(self.path)
+
+    def writeFrame(self, canvas, delay):
+        if self.video is None:
+            import imageio.v2 as imageio
+            self.video = imageio.get_writer(
+                self.path, format="FFMPEG", mode="I", fps=self.fps,
+                codec="libx264", quality=None, pixelformat="yuv420p",
+                macro_block_size=1,
+                output_params=["-crf", str(self.crf), "-preset", self.preset])
+
+        # yuv420p needs even sizes, drop the odd row or column
+        height, width = canvas.shape[:2]
+        canvas = canvas[:height - height % 2, :width - width % 2]
+
+        # Frames up to where this one ends, carrying the rounding error
+        self.time += delay
+        end = max(round(self.time * self.fps / 1000), self.shown + 1)
+        for _ in range(end - self.shown):
+            self.video.append_data(canvas)
+        self.shown = end
+
+    def close(self):
+        if self.video:
+            self.video.close()
+            self.video = None
+
+
+def createWriter(path, options):
+    # Writer for the options' output format, None for GIF
+    if options.format == "webp":
+        return WebPWriter(path, options.webp_quality, options.webp_method)
+    if options.format == "apng":
+        return APNGWriter(path, options.apng_colors, options.apng_compression)
+    if options.format == "mp4":
+        return MP4Writer(path, options.fps, options.mp4_crf, options.mp4_preset)
+    if options.format != "gif":
+        raise ValueError(f"Unknown output format: {options.format}")
+    return None
@@ -0,0 +1,124 @@
+import itertools
+import threading
+import traceback
+
+
+QUEUED = "queued"
+ENCODING = "encoding"
+DONE = "done"
+FAILED = "failed"
+
+
+# One captured recording waiting to be saved. run() does the saving and
+# returns its stats, held is the memory its frames take until then.
+class EncodeJob:
+
+    ids = itertools.count(1)
+
+    def __init__(self, name, run, held=0):
+        self.id = next(self.ids)
+        self.name = name
+        self.run = run
+        self.held = held
+        self.status = QUEUED
+        self.stats = None
+        self.error = None
+
+
+# Saves captured recordings on background threads, so a new recording can
+# start while earlier ones are still encoding. Jobs run in the order they
+# came in, on up to workers threads at once. submit() waits while the frames
+# held by unfinished jobs would go over memory_limit bytes, unless nothing
+# else is unfinished. on_change(job) is called, from whichever thread
+# changed it, whenever a job's status changes. Threads only live while there
+# are jobs, and the process waits for them before exiting.
+class EncodeQueue:
+
+    def __init__(self, workers=1, memory_limit=None, on_change=None):
+        self.workers = max(workers, 1)
+        self.memory_limit = memory_limit
+        self.on_change = on_change
+
+        self.pending = []
+        self.running = []
+        self.held = 0
+        self.threads = 0
+        self.condition = threading.Condition()
+
+    def configure(self, workers, memory_limit=None):
+        with self.condition:
+            self.workers = max(workers, 1)
+            self.memory_limit = memory_limit
+            self.startThreads()
+            self.condition.notify_all()
+
+    def wouldWait(self, held):
+        with self.condition:
+            return self.overLimit(held)
+
+    def overLimit(self, held):
+        busy = self.pending or self.running
+        return bool(self.memory_limit and busy
+                    and self.held + held > self.memory_limit)
+
+    def submit(self, job):
+        with self.condition:
+            while self.overLimit(job.held):
+                self.condition.wait()
+
+            self.pending.append(job)
+            self.held += job.held
+            self.startThreads()
+            self.condition.notify_all()
+
+        self.changed(job)
+        return job
+
+    def jobs(self):
+        # Unfinished jobs, oldest first
+        with self.condition:
+            return self.running + self.pending
+
+    def join(self):
+        # Blocks until every submitted job has finished
+        with self.condition:
+            while self.pending or self.running:
+                self.condition.wait()
+
+    def startThreads(self):
+        unfinished = len(self.pending) + len(self.running)
+        while self.threads < min(self.workers, unfinished):
+            self.threads += 1
+            threading.Thread(target=self.work).start()
+
+    def work(self):
+        while True:
+            with self.condition:
+                if not self.pending or self.threads > self.workers:
+                    self.threads -= 1
+                    return
+
+                job = self.pending.pop(0)
+                self.running.append(job)
+                job.status = ENCODING
+
+            self.changed(job)
+
+            try:
+                job.stats = job.run()
+                job.status = DONE
+            except Exception as error:
+                traceback.print_exc()
+                job.error = error
+                job.status = FAILED
+
+            with self.condition:
+                self.running.remove(job)
+                self.held -= job.held
+                self.condition.notify_all()
+
+            self.changed(job)
+
+    def changed(self, job):
+        if self.on_change:
+            self.on_change(job)
@@ -0,0 +1,232 @@
+import json
+import os
+import re
+import sqlite3
+import time
+from scripts.formats import EXTENSIONS
+
+
+INDEX_NAME = "library.sqlite3"
+
+RECORDING = "recording"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL,
+    region TEXT,
+    fps REAL,
+    frames INTEGER,
+    duration REAL,
+    size INTEGER,
+    settings TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS captures_created ON captures (status, created);
+CREATE INDEX IF NOT EXISTS captures_size ON captures (status, size);
+PRAGMA user_version = 1;
+"""
+SCHEMA_VERSION = 1
+
+# Conditions and orders lookups can use, each one served by an index on
+# (status, column)
+FILTERS = {
+    "all": "",
+    "since": "AND created >= ?",
+    "between": "AND created >= ? AND created < ?",
+    "larger": "AND size >= ?",
+    "sized": "AND size >= ? AND size <= ?",
+}
+ORDERS = {
+    "created": "created DESC",
+    "size": "size DESC",
+}
+
+# Names of the recordings we write, e.g. gif_12.webp
+NAME_PATTERN = re.compile(r"gif_(\d+)\.\w+$")
+
+
+# Index of the recordings in a save directory, kept in a SQLite file next to
+# them. File names come from the index, so they are never reused, even after
+# files are deleted or while other recordings are still saving. Lookups go
+# through indexes instead of listing the directory. A missing index is
+# rebuilt from the files on disk.
+#
+# Every call opens its own connection, so a Library can be used from any
+# thread, and by several processes at once.
+class Library:
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, INDEX_NAME)
+
+        os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(self.path):
+            self.createSchema()
+            self.rebuild()
+            return
+
+        connection = self.connect()
+        try:
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            connection.close()
+        if version < SCHEMA_VERSION:
+            self.createSchema()
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def createSchema(self):
+        connection = self.connect()
+        try:
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+    def filePath(self, entry):
+        return os.path.join(self.directory, entry["name"])
+
+    def allocate(self, extension, region=None, options=None):
+        # Reserves the next free name and creates its file. Returns
+        # (id, path).
+        connection = self.connect()
+        try:
+            while True:
+                connection.execute("BEGIN IMMEDIATE")
+                cursor = connection.execute(
+                    "INSERT INTO captures (name, status, region, fps, settings, created) "
+                    "VALUES ('', ?, ?, ?, ?, ?)",
+                    (RECORDING, json.dumps(region),
+                     options.fps if options else None,
+                     json.dumps(vars(options), default=str) if options else None, time.time()))
+                capture_id = cursor.lastrowid
+                name = f"gif_{capture_id}{extension}"
+                path = os.path.join(self.directory, name)
+
+                try:
+                    open(path, "xb").close()
+                except FileExistsError:
+                    # Left by something else, the id stays used up
+                    connection.execute("DELETE FROM captures WHERE id = ?", (capture_id,))
+                    connection.execute("COMMIT")
+                    continue
+
+                connection.execute("UPDATE captures SET name = ? WHERE id = ?",
+                                   (name, capture_id))
+                connection.execute("COMMIT")
+                return capture_id, path
+        finally:
+            connection.close()
+
+    def finish(self, capture_id, stats):
+        self.execute(
+            "UPDATE captures SET status = ?, frames = ?, duration = ?, size = ? "
+            "WHERE id = ?",
+            (DONE, stats.get("frames_written"), stats.get("duration"),
+             stats.get("size"), capture_id))
+
+    def fail(self, capture_id):
+        self.execute("UPDATE captures SET status = ? WHERE id = ?",
+                     (FAILED, capture_id))
+
+    def remove(self, capture_id):
+        self.execute("DELETE FROM captures WHERE id = ?", (capture_id,))
+
+    def execute(self, query, parameters=()):
+        connection = self.connect()
+        try:
+            connection.execute(query, parameters)
+        finally:
+            connection.close()
+
+    def rows(self, query, parameters=()):
+        # Rows of query as dicts, read from the cursor as they are used
+        connection = self.connect()
+        try:
+            for row in connection.execute(query, parameters):
+                yield dict(row)
+        finally:
+            connection.close()
+
+    def find(self, where="all", parameters=(), order="created", limit=None):
+        # Saved recordings whose files still exist. where and order name one
+        # of FILTERS and ORDERS. Only the entries returned are checked against
+        # the disk, those of deleted files are dropped and replaced.
+        query = (f"SELECT * FROM captures WHERE status = ? {FILTERS[where]} "
+                 f"ORDER BY {ORDERS[order]}")
+        parameters = (DONE,) + tuple(parameters)
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters += (limit,)
+
+        while True:
+            found = []
+            missing = []
+            for entry in self.rows(query, parameters):
+                if os.path.exists(self.filePath(entry)):
+                    found.append(entry)
+                else:
+                    missing.append(entry["id"])
+
+            if not missing:
+                return found
+            for capture_id in missing:
+                self.remove(capture_id)
+            if limit is None:
+                return found
+
+    def latest(self):
+        found = self.find(limit=1)
+        return found[0] if found else None
+
+    def byDate(self, start, end=None, limit=None):
+        # Recordings created from start to end, as time.time() values
+        if end is None:
+            return self.find("since", (start,), limit=limit)
+        return self.find("between", (start, end), limit=limit)
+
+    def bySize(self, smallest=0, largest=None, limit=None):
+        # Recordings from smallest to largest bytes, biggest first
+        if largest is None:
+            return self.find("larger", (smallest,), "size", limit)
+        return self.find("sized", (smallest, largest), "size", limit)
+
+    def rebuild(self):
+        # Indexes the recordings already in the directory. Frame counts and
+        # durations aren't known for them.
+        extensions = tuple(EXTENSIONS.values())
+        entries = []
+        highest = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.lower().endswith(extensions) or not os.path.isfile(path):
+                continue
+
+            match = NAME_PATTERN.match(name)
+            if match:
+                highest = max(highest, int(match.group(1)))
+
+            info = os.stat(path)
+            entries.append((name, DONE, info.st_size, info.st_mtime))
+
+        connection = self.connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "INSERT OR IGNORE INTO captures (name, status, size, created) "
+                "VALUES (?, ?, ?, ?)", entries)
+
+            # New names continue after the ones already on disk
+            connection.execute("DELETE FROM sqlite_sequence WHERE name = 'captures'")
+            connection.execute(
+                "INSERT INTO sqlite_sequence (name, seq) VALUES ('captures', ?)",
+                (max(highest, len(entries)),))
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
@@ -0,0 +1,100 @@
+import json
+import os
+import platform
+import time
+
+
+# How often live metrics are reported while recording, in seconds
+METRICS_INTERVAL = 1.0
+
+
+# Collects what a recording is doing while it runs and reports a snapshot
+# every interval: time spent grabbing and converting, queue depth, achieved
+# fps, dropped frames, bytes held in memory or on disk and the output size
+# so far. Snapshots go to on_metrics and, if given, to a JSON-lines file.
+class CaptureMetrics:
+
+    def __init__(self, on_metrics=None, stats_path=None, interval=METRICS_INTERVAL):
+        self.on_metrics = on_metrics
+        self.interval = interval
+        self.file = None
+        if stats_path:
+            directory = os.path.dirname(stats_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.file = open(stats_path, "w")
+
+        self.start_time = None
+        self.last_time = None
+        self.last_frames = 0
+        self.last_converted = 0
+        self.last_convert_time = 0
+        self.grab_time = 0
+        self.grabs = 0
+
+    def start(self, info=None):
+        # The first line says what machine and settings the stats are from
+        self.start_time = self.last_time = time.perf_counter()
+        self.write({"event": "start", "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "platform": platform.platform(), "cpus": os.cpu_count(),
+                    **(info or {})})
+
+    def grabbed(self, elapsed):
+        self.grab_time += elapsed
+        self.grabs += 1
+
+    def due(self):
+        return time.perf_counter() - self.last_time >= self.interval
+
+    def report(self, scheduler, pipeline, buffered=0, written=0, estimated=None,
+               **state):
+        # Snapshot of the interval since the last report, with anything in
+        # state added as is
+        now = time.perf_counter()
+        window = now - self.last_time
+
+        frames = len(scheduler.timestamps)
+        converted = pipeline.converted
+        convert_time = pipeline.convert_time
+        new_converted = converted - self.last_converted
+
+        snapshot = {
+            "event": "metrics",
+            "elapsed": round(now - self.start_time, 3),
+            "fps": round((frames - self.last_frames) / window, 2) if window else 0,
+            "grab_ms": round(self.grab_time / self.grabs * 1000, 2) if self.grabs else 0,
+            "convert_ms": round((convert_time - self.last_convert_time)
+                                / new_converted * 1000, 2) if new_converted else 0,
+            "queue_depth": pipeline.queue.depth(),
+            "frames": frames,
+            "late": scheduler.late,
+            "dropped": scheduler.dropped,
+            "queue_dropped": pipeline.queue.dropped,
+            "bytes_buffered": buffered,
+            "bytes_written": written,
+            "estimated_size": estimated,
+            **state,
+        }
+
+        self.last_time = now
+        self.last_frames = frames
+        self.last_converted = converted
+        self.last_convert_time = convert_time
+        self.grab_time = 0
+        self.grabs = 0
+
+        self.write(snapshot)
+        if self.on_metrics:
+            self.on_metrics(snapshot)
+        return snapshot
+
+    def finish(self, stats):
+        self.write({"event": "done", **stats})
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def write(self, entry):
+        if self.file:
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
@@ -0,0 +1,159 @@
+import numpy as np
+from PIL import Image
+
+
+# Color distance allowed per point of lossiness, so the default compression
+# of 35 merges colors that are about 17 RGB units apart
+LOSSY_SCALE = 0.5
+
+# Unchanged pixels only become transparent in runs at least this long. Short
+# gaps between changed pixels compress better left as they are.
+TRANSPARENT_RUN = 16
+
+# Frames with less than this share of their pixels in such runs are drawn in
+# full. The few transparent runs break up more of the strings the LZW
+# encoder would find than they save.
+MIN_TRANSPARENT = 0.25
+
+
+def colorDistance(a, b):
+    difference = a.astype(np.int32) - b
+    return (difference * difference).sum(axis=-1)
+
+
+def lossyRows(indices, colors, threshold, breaks=None):
+    # Extends runs of similar colors along each row by repeating the run's
+    # first index, so the LZW encoder finds long repeated strings. This is
+    # what gifsicle's --lossy exploits, done with whole-array operations.
+    if threshold <= 0 or indices.shape[1] < 2:
+        return indices
+
+    limit = threshold * threshold
+    rgb = colors[indices]
+    height, width = indices.shape
+    rows = np.arange(height)[:, None]
+    columns = np.arange(width)
+
+    start = np.zeros(indices.shape, dtype=bool)
+    start[:, 0] = True
+    start[:, 1:] = colorDistance(rgb[:, 1:], rgb[:, :-1]) > limit
+
+    # Pixels that must keep their index (e.g. transparent) stand alone
+    if breaks is not None:
+        start |= breaks
+        start[:, 1:] |= breaks[:, :-1]
+
+    # A run can drift along a gradient, so split it wherever a pixel ends up
+    # too far from the run's color and fill again
+    for _ in range(4):
+        source = np.where(start, columns, 0)
+        np.maximum.accumulate(source, axis=1, out=source)
+
+        far = colorDistance(rgb, rgb[rows, source]) > limit
+        if not far.any():
+            break
+        start |= far
+    else:
+        source = np.where(start, columns, 0)
+        np.maximum.accumulate(source, axis=1, out=source)
+
+    return indices[rows, source]
+
+
+def longRuns(mask, length):
+    # mask with the runs of True along each row that are shorter than length
+    # set to False. Narrowing every run by length - 1 pixels leaves one
+    # pixel at the start of each long run, widening them back fills in the
+    # rest. Both are done in passes that double the width they cover.
+    height, width = mask.shape
+    if width < length:
+        return np.zeros(mask.shape, dtype=bool)
+
+    starts = mask
+    span = 1
+    while span < length:
+        step = min(span, length - span)
+        starts = starts[:, :-step] & starts[:, step:]
+        span += step
+
+    inside = np.zeros(mask.shape, dtype=bool)
+    inside[:, :starts.shape[1]] = starts
+    span = 1
+    while span < length:
+        step = min(span, length - span)
+        inside[:, step:] |= inside[:, :-step]
+        span += step
+    return inside
+
+
+# Optimizes palette-mapped frames in memory before they are written, as an
+# alternative to running gifsicle on the finished file. Pixels that look the
+# same as what is already shown become transparent, frames are cropped to
+# what is left, and the lossy pass lengthens runs of similar colors. With no
+# lossiness only pixels with the same palette index as what is shown count
+# as the same, which is what the encoder uses by default.
+class FrameOptimizer:
+
+    def __init__(self, colors=256, lossiness=0):
+        # One palette slot is kept for transparency
+        self.colors = min(colors, 255)
+        self.threshold = lossiness * LOSSY_SCALE
+        self.palette = None
+        self.transparent = None
+        self.canvas = None
+
+    def start(self, palette):
+        self.palette = palette
+        self.transparent = len(palette.colors)
+        self.palette_colors = palette.colors.astype(np.int32)
+
+    def paletteBytes(self):
+        return self.palette.bytes() + b"\0\0\0"
+
+    def optimize(self, frame, offset):
+        # Returns (indexed image, offset), or None when nothing visibly changed
+        # Indices are only worked on in place or copied before the next frame
+        indices = self.palette.indices(frame, offset, reuse=True)
+
+        if self.canvas is None:
+            indices = lossyRows(indices, self.palette_colors, self.threshold)
+            self.canvas = indices.copy()
+            return self.toImage(indices), offset
+
+        left, top = offset
+        height, width = indices.shape
+        shown = self.canvas[top:top + height, left:left + width]
+
+        # Pixels that already look right on screen don't need redrawing
+        if self.threshold > 0:
+            limit = self.threshold * self.threshold
+            same = colorDistance(self.palette_colors[indices],
+                                 self.palette_colors[shown]) <= limit
+        else:
+            same = indices == shown
+
+        rows = np.flatnonzero(~same.all(axis=1))
+        if rows.size == 0:
+            return None
+        cols = np.flatnonzero(~same.all(axis=0))
+        y0, y1 = rows[0], rows[-1] + 1
+        x0, x1 = cols[0], cols[-1] + 1
+
+        indices = indices[y0:y1, x0:x1]
+        same = same[y0:y1, x0:x1]
+
+        indices = lossyRows(indices, self.palette_colors, self.threshold, same)
+        same = longRuns(same, TRANSPARENT_RUN)
+        shown = self.canvas[top + y0:top + y1, left + x0:left + x1]
+        if np.count_nonzero(same) < MIN_TRANSPARENT * same.size:
+            shown[:] = indices
+        else:
+            np.copyto(shown, indices, where=~same)
+            np.copyto(indices, self.transparent, where=same)
+
+        return self.toImage(indices), (left + int(x0), top + int(y0))
+
+    def toImage(self, indices):
+        image = Image.fromarray(indices.astype(np.uint8))
+        image.putpalette(self.paletteBytes())
+        return image
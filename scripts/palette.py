@@ -0,0 +1,331 @@
+import numpy as np
+from PIL import Image
+
+
+# Bits per channel of the color histogram and the lookup table
+BITS = 6
+SHIFT = 8 - BITS
+
+MAX_SAMPLES = 250000
+
+DITHER_MODES = ["none", "ordered", "diffusion"]
+
+
+def bayerMatrix(size):
+    # size x size ordered dither matrix with each of the levels 0 to
+    # size * size - 1 once, size a power of 2
+    matrix = np.zeros((1, 1), dtype=np.int16)
+    while matrix.shape[0] < size:
+        matrix = np.block([[4 * matrix, 4 * matrix + 2],
+                           [4 * matrix + 3, 4 * matrix + 1]])
+    return matrix
+
+
+# Threshold levels of an 8 x 8 ordered dither, 0 to 63. A pixel that should
+# be some way from one palette color to another shows the other color where
+# the level is below that many 64ths.
+BAYER = bayerMatrix(8).astype(np.uint8)
+LEVELS = BAYER.size
+
+# Pixels less than a histogram bin's width off their palette color aren't
+# dithered, so flat areas stay flat
+DEAD_ZONE = 1 << SHIFT
+
+
+def orderedPattern(shape, offset=(0, 0)):
+    # BAYER tiled over an (h, w) frame at offset on screen
+    height, width = shape
+    left, top = offset
+    size = len(BAYER)
+    tiled = np.tile(BAYER, (height // size + 2, width // size + 2))
+    return tiled[top % size:top % size + height, left % size:left % size + width]
+
+
+def neighbourDistances(colors):
+    # Distance from each palette color to the nearest other one
+    colors = np.asarray(colors, dtype=np.float32)
+    if len(colors) < 2:
+        return np.zeros(len(colors), dtype=np.float32)
+    distances = ((colors[:, None] - colors[None]) ** 2).sum(axis=-1)
+    np.fill_diagonal(distances, np.inf)
+    return np.sqrt(distances.min(axis=1))
+
+
+def squaredLengths(vectors):
+    return np.einsum("...i,...i->...", vectors, vectors)
+
+
+def ditherTargets(points, colors, nearest):
+    # Where to look for the second color ordered dithering mixes into
+    # points, whose nearest palette colors are nearest: past them in the
+    # direction they are off, by the distance from that color to its
+    # nearest neighbour
+    points = np.asarray(points, dtype=np.float32)
+    colors = np.asarray(colors, dtype=np.float32)
+    error = points - colors[nearest]
+    reach = neighbourDistances(colors)[nearest] / np.maximum(np.sqrt(squaredLengths(error)), 1)
+    error *= reach[..., None]
+    error += points
+    return np.clip(np.round(error), 0, 255).astype(np.uint8)
+
+
+def mixLevels(points, colors, nearest, second, dead_zone=DEAD_ZONE):
+    # How many of the LEVELS show second instead of nearest, so that on
+    # average points come out where they project onto the line between the
+    # two colors
+    colors = np.asarray(colors, dtype=np.float32)
+    error = np.asarray(points, dtype=np.float32) - colors[nearest]
+    towards = colors[second] - colors[nearest]
+    along = np.einsum("...i,...i->...", error, towards)
+    along *= LEVELS / np.maximum(squaredLengths(towards), 1)
+    along[squaredLengths(error) < dead_zone * dead_zone] = 0
+    return np.clip(np.round(along), 0, LEVELS).astype(np.uint8)
+
+
+def paletteImage(colors):
+    # A "P" image with colors as its palette, for Pillow to map to. Unused
+    # entries repeat the first color.
+    colors = np.asarray(colors, dtype=np.uint8)
+    table = np.empty((256, 3), dtype=np.uint8)
+    table[:] = colors[0]
+    table[:len(colors)] = colors
+
+    image = Image.new("P", (1, 1))
+    image.putpalette(table.tobytes())
+    return image
+
+
+def diffusionIndices(rgb, image, count):
+    # Palette indices of an (h, w, 3) frame with Floyd-Steinberg dithering
+    # by Pillow, onto a palette image from paletteImage() with count colors
+    indexed = Image.fromarray(np.ascontiguousarray(rgb)).quantize(
+        palette=image, dither=Image.Dither.FLOYDSTEINBERG)
+    indices = np.asarray(indexed)
+    return np.where(indices < count, indices, 0).astype(np.uint8)
+
+
+def packColors(rgb):
+    # (..., 3) uint8 colors to histogram bin numbers
+    q = (rgb >> SHIFT).astype(np.int32)
+    return (q[..., 0] << (2 * BITS)) | (q[..., 1] << BITS) | q[..., 2]
+
+
+def unpackColors(packed):
+    # Bin numbers to the color at the center of each bin
+    mask = (1 << BITS) - 1
+    q = np.stack([(packed >> (2 * BITS)) & mask,
+                  (packed >> BITS) & mask,
+                  packed & mask], axis=-1)
+    return (q << SHIFT) + (1 << SHIFT) // 2
+
+
+def samplePixels(frames, max_samples=MAX_SAMPLES):
+    # Evenly strided pixels from all (h, w, 3) frames, about max_samples in
+    # total
+    total = sum(frame.shape[0] * frame.shape[1] for frame in frames)
+    step = max(total // max_samples, 1)
+
+    pixels = [np.asarray(frame).reshape(-1, 3)[::step] for frame in frames]
+    return np.concatenate(pixels)
+
+
+def sampleFrames(frames, count):
+    # Up to count evenly spaced arrays from a list or spool of
+    # (frame, offset) frames
+    if len(frames) <= count:
+        indices = range(len(frames))
+    else:
+        indices = np.linspace(0, len(frames) - 1, count).round().astype(int)
+
+    return [frames[int(index)][0] for index in indices]
+
+
+def medianCut(pixels, colors=256):
+    # Splits the pixel histogram into boxes at the weighted median of their
+    # longest axis until there are enough boxes, one palette color per box
+    bins, counts = np.unique(packColors(pixels), return_counts=True)
+    points = unpackColors(bins)
+
+    def box(points, counts):
+        spread = points.max(axis=0) - points.min(axis=0)
+        score = int(spread.max()) * int(counts.sum()) if len(points) > 1 else 0
+        return score, points, counts, int(spread.argmax())
+
+    boxes = [box(points, counts)]
+    while len(boxes) < colors:
+        index = max(range(len(boxes)), key=lambda i: boxes[i][0])
+        score, points, counts, axis = boxes[index]
+        if score == 0:
+            break
+
+        order = np.argsort(points[:, axis], kind="stable")
+        points = points[order]
+        counts = counts[order]
+
+        cumulative = np.cumsum(counts)
+        cut = int(np.searchsorted(cumulative, cumulative[-1] / 2)) + 1
+        cut = min(max(cut, 1), len(points) - 1)
+
+        boxes[index] = box(points[:cut], counts[:cut])
+        boxes.append(box(points[cut:], counts[cut:]))
+
+    palette = [np.average(points, axis=0, weights=counts)
+               for _, points, counts, _ in boxes]
+    return np.clip(np.round(palette), 0, 255).astype(np.uint8)
+
+
+# Fixed palette shared by every frame, with a lookup table from histogram bin
+# to the nearest palette index so mapping a frame is a single gather. Frames
+# can be dithered on the way, see DITHER_MODES.
+class Palette:
+
+    def __init__(self, colors, dither="none", bins=None):
+        if dither not in DITHER_MODES:
+            raise ValueError(f"Unknown dither mode: {dither}")
+
+        # Given bins, the tables are only filled in for those, see
+        # FramePalette
+        self.bins = np.arange(1 << (3 * BITS)) if bins is None else bins
+
+        self.colors = np.asarray(colors, dtype=np.uint8)
+        self.lookup = self.buildLookup()
+        self.dither = dither
+        if dither == "ordered":
+            self.levels, self.pairs = self.buildMix()
+        self.image = paletteImage(self.colors) if dither == "diffusion" else None
+
+        # Buffers for indices(), reused for frames of any size up to the
+        # largest one so far. Mapping is done from one thread at a time.
+        self.buffers = {}
+        self.tiling = None
+
+    def buildLookup(self):
+        lookup = np.zeros(1 << (3 * BITS), dtype=np.uint8)
+        lookup[self.bins] = self.nearest(unpackColors(self.bins))
+        return lookup
+
+    def nearest(self, points):
+        # Index of the palette color nearest to each of the (n, 3) points
+        points = np.asarray(points, dtype=np.float32)
+        colors = self.colors.astype(np.float32)
+        color_norms = (colors ** 2).sum(axis=1)
+
+        indices = np.empty(len(points), dtype=np.uint8)
+        chunk = 16384
+        for start in range(0, len(points), chunk):
+            part = points[start:start + chunk]
+            distances = color_norms - 2 * part @ colors.T
+            indices[start:start + chunk] = distances.argmin(axis=1)
+
+        return indices
+
+    def buildMix(self):
+        # For each histogram bin, mixLevels() and the (nearest, second)
+        # palette indices side by side, so a dithered pixel is one gather for
+        # its level and one for its index
+        centers = unpackColors(self.bins)
+        nearest = self.lookup[self.bins]
+        targets = ditherTargets(centers, self.colors, nearest)
+
+        # Only a lookup covering every bin is sure to have the targets
+        if len(self.bins) == len(self.lookup):
+            second = self.lookup[packColors(targets)]
+        else:
+            second = self.nearest(targets)
+
+        levels = np.zeros(len(self.lookup), dtype=np.uint8)
+        levels[self.bins] = mixLevels(centers, self.colors, nearest, second)
+        pairs = np.stack([self.lookup, self.lookup], axis=-1)
+        pairs[self.bins, 1] = second
+        return levels, pairs.ravel()
+
+    def bytes(self):
+        return self.colors.tobytes()
+
+    def indices(self, rgb, offset=(0, 0), reuse=False):
+        # (h, w, 3) uint8 array at offset on screen to (h, w) palette indices.
+        # With reuse they are written to a buffer the next call overwrites.
+        if self.dither == "diffusion":
+            return diffusionIndices(rgb, self.image, len(self.colors))
+
+        out = self.buffer("indices", rgb.shape[:2], np.uint8) if reuse else None
+        packed = self.pack(rgb)
+        if self.dither != "ordered":
+            return np.take(self.lookup, packed, out=out, mode="clip")
+
+        # Bin numbers become positions in pairs, the second of each pair
+        # where the pattern is below the bin's level
+        shape = packed.shape
+        levels = np.take(self.levels, packed, mode="clip",
+                         out=self.buffer("levels", shape, np.uint8))
+        second = np.less(self.pattern(shape, offset), levels,
+                         out=self.buffer("second", shape, bool))
+        np.left_shift(packed, 1, out=packed)
+        np.bitwise_or(packed, second, out=packed)
+        return np.take(self.pairs, packed, out=out, mode="clip")
+
+    def pattern(self, shape, offset):
+        # orderedPattern() of a frame, cut from a tiling kept for the largest
+        # frame so far
+        height, width = shape
+        size = len(BAYER)
+        rows, columns = self.tiling.shape if self.tiling is not None else (0, 0)
+        if rows < height + size or columns < width + size:
+            self.tiling = orderedPattern((max(rows, height + size),
+                                          max(columns, width + size)))
+
+        left, top = offset
+        return self.tiling[top % size:top % size + height, left % size:left % size + width]
+
+    def buffer(self, name, shape, dtype):
+        # shape view of the named buffer, made larger when it is too small
+        size = shape[0] * shape[1]
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.size < size:
+            buffer = self.buffers[name] = np.empty(size, dtype=dtype)
+        return buffer[:size].reshape(shape)
+
+    def pack(self, rgb):
+        # packColors(rgb), packing the channels in place into a buffer that
+        # is reused
+        shape = rgb.shape[:2]
+        packed = self.buffer("packed", shape, np.int32)
+        channel = self.buffer("channel", shape, np.int32)
+
+        for index, shift in enumerate((2 * BITS, BITS, 0)):
+            target = channel if index else packed
+            np.right_shift(rgb[..., index], SHIFT, out=target)
+            if shift:
+                np.left_shift(target, shift, out=target)
+            if index:
+                np.bitwise_or(packed, channel, out=packed)
+
+        return packed
+
+    def map(self, frame, offset=(0, 0)):
+        indexed = Image.fromarray(self.indices(np.asarray(frame), offset))
+        indexed.putpalette(self.bytes())
+        return indexed
+
+
+# Palette for mapping a single frame onto the colors Pillow quantized it to.
+# Its tables only cover the bins the frame's pixels fall in, and nearest
+# colors are Pillow's, as they are for the frame itself.
+class FramePalette(Palette):
+
+    def __init__(self, frame, quantized, dither="none"):
+        self.quantized = quantized
+        present = np.zeros(1 << (3 * BITS), dtype=bool)
+        present[packColors(frame)] = True
+        colors = np.reshape(quantized.getpalette(), (-1, 3))
+        super().__init__(colors, dither, np.flatnonzero(present))
+
+    def nearest(self, points):
+        points = np.clip(np.round(points), 0, 255).astype(np.uint8)
+        image = Image.fromarray(points.reshape(1, -1, 3))
+        return np.asarray(image.quantize(palette=self.quantized,
+                                         dither=Image.Dither.NONE)).ravel()
+
+
+def buildPalette(frames, colors=256, dither="none"):
+    return Palette(medianCut(samplePixels(frames), colors), dither)
@@ -0,0 +1,261 @@
+from collections import deque
+import functools
+import threading
+import time
+import numpy as np
+from PIL import Image
+
+
+# What the grab stage does when the conversion queue is full
+BLOCK = "block"
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+POLICIES = [BLOCK, DROP_OLDEST, DROP_NEWEST]
+
+
+class FrameQueue:
+
+    def __init__(self, maxsize, policy=BLOCK, on_drop=None):
+        self.maxsize = maxsize
+        self.policy = policy
+        self.on_drop = on_drop
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+        self.sequence = 0
+
+    def put(self, item):
+        with self.condition:
+            if len(self.items) >= self.maxsize:
+                if self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+
+                if self.policy == DROP_OLDEST:
+                    dropped = self.items.popleft()
+                    self.dropped += 1
+                    if self.on_drop:
+                        self.on_drop(dropped)
+                else:
+                    while len(self.items) >= self.maxsize and not self.closed:
+                        self.condition.wait()
+
+            self.items.append(item)
+            self.condition.notify_all()
+            return True
+
+    def get(self):
+        # Returns (sequence, item), or None once closed and drained. The
+        # sequence is handed out here so dropped frames leave no gaps.
+        with self.condition:
+            while not self.items and not self.closed:
+                self.condition.wait()
+
+            if not self.items:
+                return None
+
+            item = self.items.popleft()
+            sequence = self.sequence
+            self.sequence += 1
+            self.condition.notify_all()
+            return sequence, item
+
+    def depth(self):
+        with self.condition:
+            return len(self.items)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+RESAMPLING = {
+    "nearest": Image.Resampling.NEAREST,
+    "box": Image.Resampling.BOX,
+    "bilinear": Image.Resampling.BILINEAR,
+    "bicubic": Image.Resampling.BICUBIC,
+    "lanczos": Image.Resampling.LANCZOS,
+}
+
+
+def scaledSize(size, scale):
+    return (max(round(size[0] * scale), 1), max(round(size[1] * scale), 1))
+
+
+@functools.lru_cache(maxsize=8)
+def stretchIndices(size, canvas):
+    # Pixel of a size frame each pixel of a canvas frame shows when it is
+    # stretched with nearest neighbour
+    columns = (np.arange(canvas[0]) + 0.5) * size[0] // canvas[0]
+    rows = (np.arange(canvas[1]) + 0.5) * size[1] // canvas[1]
+    return (rows[:, None] * size[0] + columns).astype(np.intp).ravel()
+
+
+def convertFrame(raw, size, scale=1, resample="bilinear", canvas=None, out=None):
+    # BGRA screen pixels to an (h, w, 3) RGB array at the output scale,
+    # written into out if given. At full scale the channels are copied from
+    # raw one at a time, which swaps R and B without a temporary frame.
+    # Scaled frames are resized by Pillow from an image that wraps raw
+    # without copying, and read back with the swap, so the resized image is
+    # the only other frame allocated. Frames scaled below the canvas size are
+    # stretched back to it with nearest neighbour.
+    target = scaledSize(size, scale)
+    width, height = canvas or target
+    if out is None:
+        out = np.empty((height, width, 3), dtype=np.uint8)
+
+    if target == size and not canvas:
+        bgrx = np.frombuffer(raw, dtype=np.uint8).reshape(height, width, 4)
+        for channel in range(3):
+            np.copyto(out[..., channel], bgrx[..., 2 - channel])
+        return out
+
+    image = Image.frombuffer("RGBX", size, raw, "raw", "RGBX", 0, 1)
+    if target != size:
+        image = image.resize(target, RESAMPLING[resample])
+    rgb = np.frombuffer(image.tobytes("raw", "BGR"), dtype=np.uint8)
+
+    if (width, height) == target:
+        np.copyto(out, rgb.reshape(height, width, 3))
+    else:
+        np.take(rgb.reshape(-1, 3), stretchIndices(target, (width, height)),
+                axis=0, out=out.reshape(-1, 3), mode="clip")
+    return out
+
+
+# Reuses the grab buffers it hands out once their frame has been converted,
+# so backends that can grab into a buffer don't allocate one per frame.
+# Buffers it didn't hand out are left alone. The buffer of the last queued
+# grab can be pinned, since the next grab is compared to it. Buffers are
+# made with allocate(size), a bytearray unless told otherwise.
+class BufferPool:
+
+    def __init__(self, size, allocate=bytearray):
+        self.size = size
+        self.allocate = allocate
+        self.free = []
+        self.lent = {}
+        self.pinned = None
+        self.pinned_released = False
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            buffer = self.free.pop() if self.free else self.allocate(self.size)
+            self.lent[id(buffer)] = buffer
+            return buffer
+
+    def release(self, buffer):
+        with self.lock:
+            if self.lent.get(id(buffer)) is not buffer:
+                return
+
+            if buffer is self.pinned:
+                self.pinned_released = True
+            else:
+                self.reuse(buffer)
+
+    def pin(self, buffer):
+        # Keeps buffer from being reused until something else is pinned
+        with self.lock:
+            previous = self.pinned
+            if previous is not None and self.pinned_released:
+                self.reuse(previous)
+
+            self.pinned = buffer
+            self.pinned_released = False
+
+    def reuse(self, buffer):
+        del self.lent[id(buffer)]
+        self.free.append(buffer)
+
+
+# Grab stage puts raw pixels in a bounded queue, conversion workers turn them
+# into RGB arrays and hand them to sink(frame, timestamp) in capture order.
+# With reuse_frames, the arrays come from a pool and each one goes back to it
+# once the sink has been handed the next frame, so the sink must copy what it
+# keeps beyond that.
+class FramePipeline:
+
+    def __init__(self, sink, workers=1, maxsize=8, policy=BLOCK,
+                 scale=1, resample="bilinear", pool=None, reuse_frames=False):
+        self.sink = sink
+        self.scale = scale
+        self.resample = resample
+        self.pool = pool
+        self.reuse_frames = reuse_frames
+        self.frames = None
+        self.delivered = None
+        self.queue = FrameQueue(maxsize, policy, self.dropFrame)
+        self.threads = [threading.Thread(target=self.work, daemon=True)
+                        for _ in range(max(workers, 1))]
+
+        # Total time spent converting, over all workers, and frames converted
+        self.convert_time = 0
+        self.converted = 0
+
+        # Converted frames waiting for earlier ones to finish
+        self.ready = {}
+        self.next_sequence = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def put(self, raw, size, timestamp, scale=None):
+        # Scale lowers the detail of this frame only, the output size stays
+        if self.reuse_frames and self.frames is None:
+            width, height = scaledSize(size, self.scale)
+            self.frames = BufferPool(
+                (height, width, 3), functools.partial(np.empty, dtype=np.uint8))
+        return self.queue.put((raw, size, timestamp, scale))
+
+    def dropFrame(self, entry):
+        if self.pool:
+            self.pool.release(entry[0])
+
+    def finish(self):
+        # Blocks until every queued frame has reached the sink
+        self.queue.close()
+        for thread in self.threads:
+            thread.join()
+
+    def work(self):
+        while True:
+            entry = self.queue.get()
+            if entry is None:
+                break
+
+            sequence, (raw, size, timestamp, scale) = entry
+            start = time.perf_counter()
+            out = self.frames.acquire() if self.frames else None
+            if scale is None or scale == self.scale:
+                frame = convertFrame(raw, size, self.scale, self.resample, out=out)
+            else:
+                frame = convertFrame(raw, size, scale, self.resample,
+                                     scaledSize(size, self.scale), out)
+            elapsed = time.perf_counter() - start
+
+            if self.pool:
+                self.pool.release(raw)
+
+            self.deliver(sequence, frame, timestamp, elapsed)
+
+    def deliver(self, sequence, frame, timestamp, elapsed=0):
+        with self.lock:
+            self.convert_time += elapsed
+            self.converted += 1
+            self.ready[sequence] = (frame, timestamp)
+
+            while self.next_sequence in self.ready:
+                frame, timestamp = self.ready.pop(self.next_sequence)
+                self.sink(frame, timestamp)
+                self.next_sequence += 1
+
+                if self.frames and self.delivered is not None:
+                    self.frames.release(self.delivered)
+                self.delivered = frame
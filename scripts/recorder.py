@@ -0,0 +1,432 @@
+import os
+import sys
+import time
+import numpy as np
+from pygifsicle import gifsicle
+from scripts.saved import GlobalSettings
+from scripts.backends import MssBackend
+from scripts.scheduler import FrameScheduler, frameDelays
+from scripts.pipeline import BufferPool, FramePipeline
+from scripts.encoder import StreamingEncoder, writeFrames
+from scripts.spool import FrameSpool, SpoolFull
+from scripts.diff import FrameDiffer
+from scripts.palette import buildPalette, sampleFrames
+from scripts.optimizer import FrameOptimizer
+from scripts.segments import optimizeSegments
+from scripts.metrics import CaptureMetrics
+from scripts.adaptive import AdaptiveController
+from scripts.formats import createWriter
+from scripts.thumbnails import PreviewCollector
+from scripts.target import fitFrames
+import scripts.saved as settings
+
+
+# Everything a recording needs to know, so it can run from the saved settings
+# in the app or from command line arguments without any Qt widgets
+class RecordingOptions:
+
+    def __init__(self, **values):
+        self.fps = settings.defaultFps
+        self.scale = settings.defaultResolution
+        self.resample = settings.defaultResample
+        self.optimize = settings.defaultOptimizing
+        self.optimizer = settings.defaultOptimizer
+        self.lossiness = settings.defaultCompression
+        self.colors = settings.defaultColors
+        self.segments = settings.defaultSegments
+        self.streaming = settings.defaultStreaming
+        self.workers = settings.defaultWorkers
+        self.queue_size = settings.defaultQueueSize
+        self.backpressure = settings.defaultBackpressure
+        self.storage = settings.defaultFrameStorage
+        self.spool_limit = settings.defaultSpoolLimit
+        self.global_palette = settings.defaultGlobalPalette
+        self.palette_frames = settings.defaultPaletteFrames
+        self.dither = settings.defaultDither
+        self.transparency = settings.defaultTransparency
+        self.target_size = settings.defaultTargetSize
+        self.adaptive = settings.defaultAdaptive
+        self.format = settings.defaultFormat
+        self.webp_quality = settings.defaultWebPQuality
+        self.webp_method = settings.defaultWebPMethod
+        self.apng_colors = settings.defaultAPNGColors
+        self.apng_compression = settings.defaultAPNGCompression
+        self.mp4_crf = settings.defaultMP4Crf
+        self.mp4_preset = settings.defaultMP4Preset
+        self.stats_file = None
+
+        for name, value in values.items():
+            if not hasattr(self, name):
+                raise TypeError(f"Unknown recording option: {name}")
+            setattr(self, name, value)
+
+    @classmethod
+    def fromSettings(cls):
+        def value(key, default, type=None):
+            if type is None:
+                return GlobalSettings.value(key, default)
+            return GlobalSettings.value(key, default, type=type)
+
+        return cls(
+            fps=value(settings.SETTING_FPS, settings.defaultFps, int),
+            scale=value(settings.SETTING_RESOLUTION,
+                        settings.defaultResolution, float),
+            resample=value(settings.SETTING_RESAMPLE, settings.defaultResample),
+            optimize=value(settings.SETTING_OPTIMIZING,
+                           settings.defaultOptimizing, bool),
+            optimizer=value(settings.SETTING_OPTIMIZER,
+                            settings.defaultOptimizer),
+            lossiness=value(settings.SETTING_COMPRESSION,
+                            settings.defaultCompression, int),
+            colors=value(settings.SETTING_COLORS, settings.defaultColors, int),
+            segments=value(settings.SETTING_SEGMENTS,
+                           settings.defaultSegments, int),
+            streaming=value(settings.SETTING_STREAMING,
+                            settings.defaultStreaming, bool),
+            workers=value(settings.SETTING_WORKERS, settings.defaultWorkers, int),
+            queue_size=value(settings.SETTING_QUEUESIZE,
+                             settings.defaultQueueSize, int),
+            backpressure=value(settings.SETTING_BACKPRESSURE,
+                               settings.defaultBackpressure),
+            storage=value(settings.SETTING_FRAMESTORAGE,
+                          settings.defaultFrameStorage),
+            spool_limit=value(settings.SETTING_SPOOLLIMIT,
+                              settings.defaultSpoolLimit, int),
+            global_palette=value(settings.SETTING_GLOBALPALETTE,
+                                 settings.defaultGlobalPalette, bool),
+            palette_frames=value(settings.SETTING_PALETTEFRAMES,
+                                 settings.defaultPaletteFrames, int),
+            dither=value(settings.SETTING_DITHER, settings.defaultDither),
+            transparency=value(settings.SETTING_TRANSPARENCY,
+                               settings.defaultTransparency, bool),
+            target_size=value(settings.SETTING_TARGETSIZE,
+                              settings.defaultTargetSize, float),
+            adaptive=value(settings.SETTING_ADAPTIVE,
+                           settings.defaultAdaptive, bool),
+            format=value(settings.SETTING_FORMAT, settings.defaultFormat),
+            webp_quality=value(settings.SETTING_WEBPQUALITY,
+                               settings.defaultWebPQuality, int),
+            webp_method=value(settings.SETTING_WEBPMETHOD,
+                              settings.defaultWebPMethod, int),
+            apng_colors=value(settings.SETTING_APNGCOLORS,
+                              settings.defaultAPNGColors, int),
+            apng_compression=value(settings.SETTING_APNGCOMPRESSION,
+                                   settings.defaultAPNGCompression, int),
+            mp4_crf=value(settings.SETTING_MP4CRF, settings.defaultMP4Crf, int),
+            mp4_preset=value(settings.SETTING_MP4PRESET,
+                             settings.defaultMP4Preset),
+        )
+
+
+# Captures a screen region into a GIF at path until should_stop() returns
+# true, then finishes encoding and optimizing it. record() and save() split
+# the two, so saving can run later on another thread.
+class Recorder:
+
+    def __init__(self, region, path, options=None, backend=None):
+        self.region = region
+        self.path = path
+        self.options = options or RecordingOptions()
+        self.full = False
+
+        # Where frames come from, the screen unless told otherwise
+        self.backend = backend or MssBackend()
+
+    def run(self, should_stop, on_saving=None, on_metrics=None):
+        # Returns stats about the recording. on_metrics gets a snapshot of
+        # live metrics about once a second while recording.
+        self.record(should_stop, on_metrics)
+        if on_saving:
+            on_saving()
+        return self.save()
+
+    def record(self, should_stop, on_metrics=None):
+        # Captures until should_stop() returns true. Frames still to encode
+        # stay in memory, in the spool or in the streaming encoder's queue.
+        options = self.options
+        path = self.path
+        screenshots = []
+        timestamps = []
+        buffered = 0
+        global_palette = options.global_palette
+
+        # Other formats than GIF have encoders of their own, the palette and
+        # optimizer settings only apply to GIF
+        writer = createWriter(path, options)
+        optimize = options.optimize and not writer
+        if writer:
+            global_palette = False
+
+        # To fit a size limit, frames are kept until the end, when trial
+        # encodes pick the scale, fps, colors and lossiness. Everything else
+        # about encoding is decided then.
+        fit = bool(options.target_size) and not writer
+        if fit:
+            optimize = global_palette = False
+
+        # The built-in optimizer works on frames in memory, before they are
+        # written, and needs a shared palette to compare frames against
+        optimizer = None
+        palette_colors = 256
+        if optimize and options.optimizer == "builtin":
+            optimizer = FrameOptimizer(options.colors, options.lossiness)
+            global_palette = True
+            palette_colors = optimizer.colors
+
+        # Segments optimized in parallel only merge cleanly if they share
+        # one palette that gifsicle doesn't need to reduce any further
+        parallel = optimize and not optimizer and options.segments > 1
+        if parallel:
+            global_palette = True
+            palette_colors = options.colors
+        post_optimize = optimize and not optimizer and not parallel
+
+        # Otherwise pixels with the same palette index as the frame before
+        # still become transparent while encoding, so the LZW encoder sees
+        # long runs of one index. This takes one palette slot.
+        if not optimizer and global_palette and options.transparency:
+            optimizer = FrameOptimizer(palette_colors)
+            palette_colors = optimizer.colors
+
+        scheduler = FrameScheduler(options.fps)
+
+        # Encode frames to disk while recording instead of all at the end
+        encoder = None
+        spool = None
+        if options.streaming and not fit:
+            encoder = StreamingEncoder(
+                path, scheduler.interval,
+                options.palette_frames if global_palette else 0,
+                optimizer, palette_colors, writer, options.dither)
+            encoder.start()
+
+            def store(frame, timestamp, offset):
+                # Encoding failed, stop recording, save() raises the error
+                if encoder.error:
+                    self.full = True
+                    return
+
+                # Frames go back to the pipeline's pool, the encoder queues
+                # a copy of the crop
+                encoder.add(np.array(frame), timestamp, offset)
+        elif options.storage != "memory":
+            # Keep frames in a spool file, in the temp or save directory
+            spool_dir = os.path.dirname(path) if options.storage == "save" else None
+            spool = FrameSpool(spool_dir, options.spool_limit * 1024 * 1024)
+
+            def store(frame, timestamp, offset):
+                try:
+                    spool.append(frame, timestamp, offset)
+                except SpoolFull as error:
+                    print(error, file=sys.stderr)
+                    self.full = True
+        else:
+            def store(frame, timestamp, offset):
+                nonlocal buffered
+
+                # Frames go back to the pipeline's pool, keep a copy
+                frame = np.array(frame)
+                screenshots.append((frame, offset))
+                timestamps.append(timestamp)
+                buffered += frame.nbytes
+
+        def report():
+            state = {"target_fps": scheduler.fps, "capture_scale": round(scale, 3)}
+            if encoder:
+                return metrics.report(scheduler, pipeline, encoder.buffered(),
+                                      encoder.encoder.bytes, encoder.estimatedSize(),
+                                      **state)
+            if spool:
+                return metrics.report(scheduler, pipeline, spool.bytes, **state)
+            return metrics.report(scheduler, pipeline, buffered, **state)
+
+        # Skip unchanged frames and crop the rest to what changed
+        differ = FrameDiffer()
+
+        # Library thumbnails come from the full frames while they are here
+        preview = PreviewCollector()
+
+        def sink(frame, timestamp):
+            preview.add(frame, timestamp)
+            change = differ.update(frame)
+            if change:
+                store(change[0], timestamp, change[1])
+
+        self.backend.open(self.region)
+
+        # Grab buffers go back to the pool once converted, for backends that
+        # can grab into them
+        width, height = self.backend.size
+        pool = BufferPool(width * height * 4)
+
+        # Conversion and scaling run on worker threads so they can't slow
+        # down grabbing, and everything after works at the output size.
+        # Converted frames are reused too, the sink keeps copies of crops.
+        pipeline = FramePipeline(sink, options.workers, options.queue_size,
+                                 options.backpressure, options.scale,
+                                 options.resample, pool, reuse_frames=True)
+        pipeline.start()
+
+        metrics = CaptureMetrics(on_metrics, options.stats_file)
+        metrics.start({"path": path, "size": list(self.backend.size),
+                       "options": vars(options)})
+
+        # Steps fps and scale down when the pipeline falls behind. Frames
+        # keep their real capture times, so delays follow the changes.
+        controller = None
+        scale = options.scale
+        if options.adaptive:
+            controller = AdaptiveController(options.fps, options.scale,
+                                            options.workers, options.queue_size)
+
+        last_raw = None
+        grab_time = 0
+        with self.backend as backend:
+            scheduler.start()
+            while not (self.full or should_stop()):
+                # Only copy the raw pixels here
+                start = time.perf_counter()
+                buffer = pool.acquire() if backend.fills_buffer else None
+                raw = backend.grabInto(buffer)
+                if buffer is not None and raw is not buffer:
+                    pool.release(buffer)
+                if raw is None:
+                    break
+                scheduler.stamp()
+                elapsed = time.perf_counter() - start
+                grab_time += elapsed
+                metrics.grabbed(elapsed)
+
+                # Identical grabs never need converting
+                if raw != last_raw:
+                    pool.pin(raw)
+                    queued = pipeline.put(raw, backend.size,
+                                          scheduler.timestamps[-1], scale)
+                    if queued:
+                        last_raw = raw
+                    else:
+                        pool.pin(None)
+                        pool.release(raw)
+                        last_raw = None
+                else:
+                    pool.release(raw)
+
+                if metrics.due():
+                    snapshot = report()
+                    if controller and controller.update(
+                            snapshot, scheduler.timestamps[-1]):
+                        change = controller.changes[-1]
+                        metrics.write({"event": "adapt", **change})
+                        scheduler.setFps(change["fps"])
+                        scale = controller.scale
+
+                scheduler.wait()
+
+        self.stopped = time.perf_counter()
+        pipeline.finish()
+
+        self.buffered = buffered
+        self.state = {
+            "screenshots": screenshots, "timestamps": timestamps,
+            "encoder": encoder, "spool": spool, "writer": writer,
+            "optimizer": optimizer, "parallel": parallel,
+            "post_optimize": post_optimize, "fit": fit,
+            "global_palette": global_palette, "palette_colors": palette_colors,
+            "scheduler": scheduler, "pipeline": pipeline, "metrics": metrics,
+            "controller": controller, "grab_time": grab_time,
+            "preview": preview,
+        }
+
+    def heldBytes(self):
+        # Memory the captured frames take until they are saved. WebP and APNG
+        # writers keep every frame the streaming encoder has written.
+        state = self.state
+        if state["encoder"]:
+            held = state["writer"].held_bytes if state["writer"] else 0
+            return state["encoder"].buffered() + held
+        if state["spool"]:
+            return 0
+        return self.buffered
+
+    def save(self):
+        # Encodes and optimizes what record() captured, returns the stats
+        options = self.options
+        path = self.path
+        state = self.state
+        encoder, spool, writer = state["encoder"], state["spool"], state["writer"]
+        optimizer, scheduler = state["optimizer"], state["scheduler"]
+        pipeline, metrics, controller = state["pipeline"], state["metrics"], state["controller"]
+        timestamps = state["timestamps"]
+        fit = None
+        converted = time.perf_counter()
+
+        if encoder:
+            # Only the frames still queued are left to encode
+            encoder.finish(scheduler.end())
+            frame_count = encoder.encoder.frames
+            encode_time = encoder.encode_time
+        else:
+            frames = state["screenshots"]
+            if spool:
+                spool.finish()
+                frames = spool
+                timestamps = spool.timestamps
+
+            # One palette for the whole recording, from frames spread over it
+            palette = None
+            if state["global_palette"] and len(frames):
+                palette = buildPalette(sampleFrames(frames, options.palette_frames),
+                                       state["palette_colors"], options.dither)
+
+            # Delays come from the real capture times, so playback matches
+            # real time even when frames were late or dropped
+            if state["fit"] and len(frames):
+                frame_count, fit = fitFrames(path, frames, timestamps,
+                                             scheduler.interval, scheduler.end(),
+                                             options)
+            else:
+                frame_count = writeFrames(path, frames, frameDelays(
+                    timestamps, scheduler.interval, scheduler.end()), palette,
+                    optimizer, writer, options.dither)
+
+            if spool:
+                spool.close()
+
+        encoded = time.perf_counter()
+        if not encoder:
+            encode_time = encoded - converted
+
+        # If we are optimizing our image with gifsicle, do it
+        lossy = [f"--lossy={options.lossiness}"]
+        if state["parallel"]:
+            optimizeSegments(path, frame_count, options.segments,
+                             options.colors, lossy)
+        elif state["post_optimize"]:
+            gifsicle(sources=path, colors=options.colors,
+                     optimize=True, options=lossy)
+
+        done = time.perf_counter()
+
+        stats = scheduler.report()
+        stats.update({
+            "queue_dropped": pipeline.queue.dropped,
+            "frames_written": frame_count,
+            "duration": round(scheduler.end() or 0, 3),
+            "grab_time": round(state["grab_time"], 3),
+            "convert_time": round(pipeline.convert_time, 3),
+            "encode_time": round(encode_time, 3),
+            "optimize_time": round(done - encoded, 3),
+            "save_time": round(done - converted, 3),
+            "stop_to_file": round(done - self.stopped, 3),
+            "size": os.path.getsize(path),
+        })
+        if controller:
+            stats["adaptive_changes"] = controller.changes
+        if fit:
+            stats["target"] = fit
+        metrics.finish(stats)
+
+        # Let the frames go, all but the small previews
+        self.preview = state["preview"]
+        self.state = None
+        return stats
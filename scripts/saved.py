@@ -4,11 +4,38 @@ from PyQt6.QtCore import QSettings
 
 SETTING_OPTIMIZING = "optimizing"
 SETTING_RESOLUTION = "resolution"
+SETTING_RESAMPLE = "resample"
 SETTING_FPS = "fps"
 SETTING_COMPRESSION = "compression"
+SETTING_COLORS = "colors"
+SETTING_OPTIMIZER = "optimizer"
+SETTING_SEGMENTS = "segments"
 SETTING_STARTUP = "startup"
 SETTING_SHORTCUT = "shortcut"
 SETTING_SAVEDIRECTORY = "directory"
+SETTING_STREAMING = "streaming"
+SETTING_WORKERS = "workers"
+SETTING_QUEUESIZE = "queuesize"
+SETTING_BACKPRESSURE = "backpressure"
+SETTING_FRAMESTORAGE = "framestorage"
+SETTING_SPOOLLIMIT = "spoollimit"
+SETTING_GLOBALPALETTE = "globalpalette"
+SETTING_PALETTEFRAMES = "paletteframes"
+SETTING_STATSFILE = "statsfile"
+SETTING_ADAPTIVE = "adaptive"
+SETTING_FORMAT = "format"
+SETTING_WEBPQUALITY = "webpquality"
+SETTING_WEBPMETHOD = "webpmethod"
+SETTING_APNGCOLORS = "apngcolors"
+SETTING_APNGCOMPRESSION = "apngcompression"
+SETTING_MP4CRF = "mp4crf"
+SETTING_MP4PRESET = "mp4preset"
+SETTING_ENCODEWORKERS = "encodeworkers"
+SETTING_ENCODEMEMORY = "encodememory"
+SETTING_THUMBNAILCACHE = "thumbnailcache"
+SETTING_TRANSPARENCY = "transparency"
+SETTING_TARGETSIZE = "targetsize"
+SETTING_DITHER = "dither"
 
 
 GlobalSettings = QSettings("gifcapture", "gifcapture")
@@ -25,18 +52,74 @@ pictures_folder = pictures_folder.replace(
 
 defaultOptimizing = True
 defaultResolution = 0.75
+defaultResample = "bilinear"
 defaultFps = 15
 defaultCompression = 35
+defaultColors = 256
+defaultOptimizer = "gifsicle"
+# Parallel gifsicle segments are opt-in, their output hasn't been checked
+# against a single gifsicle run
+defaultSegments = 1
 defaultStartup = True
 defaultShortcut = "Ctrl+Shift+R"
 defaultDirectory = pictures_folder
+defaultStreaming = True
+defaultWorkers = 2
+defaultQueueSize = 8
+defaultBackpressure = "block"
+defaultFrameStorage = "memory"
+defaultSpoolLimit = 4096
+defaultGlobalPalette = True
+defaultPaletteFrames = 10
+defaultStatsFile = False
+defaultAdaptive = False
+defaultFormat = "gif"
+defaultWebPQuality = 80
+defaultWebPMethod = 4
+defaultAPNGColors = 256
+defaultAPNGCompression = 6
+defaultMP4Crf = 23
+defaultMP4Preset = "veryfast"
+defaultEncodeWorkers = 1
+defaultEncodeMemory = 2048
+defaultThumbnailCache = 64
+defaultTransparency = True
+defaultTargetSize = 0
+defaultDither = "none"
 
 
 def resetSettingsToDefault():
     GlobalSettings.setValue(SETTING_OPTIMIZING, defaultOptimizing)
     GlobalSettings.setValue(SETTING_RESOLUTION, defaultResolution)
+    GlobalSettings.setValue(SETTING_RESAMPLE, defaultResample)
     GlobalSettings.setValue(SETTING_FPS, defaultFps)
     GlobalSettings.setValue(SETTING_COMPRESSION, defaultCompression)
+    GlobalSettings.setValue(SETTING_COLORS, defaultColors)
+    GlobalSettings.setValue(SETTING_OPTIMIZER, defaultOptimizer)
+    GlobalSettings.setValue(SETTING_SEGMENTS, defaultSegments)
     GlobalSettings.setValue(SETTING_STARTUP, defaultStartup)
     GlobalSettings.setValue(SETTING_SHORTCUT, defaultShortcut)
     GlobalSettings.setValue(SETTING_SAVEDIRECTORY, defaultDirectory)
+    GlobalSettings.setValue(SETTING_STREAMING, defaultStreaming)
+    GlobalSettings.setValue(SETTING_WORKERS, defaultWorkers)
+    GlobalSettings.setValue(SETTING_QUEUESIZE, defaultQueueSize)
+    GlobalSettings.setValue(SETTING_BACKPRESSURE, defaultBackpressure)
+    GlobalSettings.setValue(SETTING_FRAMESTORAGE, defaultFrameStorage)
+    GlobalSettings.setValue(SETTING_SPOOLLIMIT, defaultSpoolLimit)
+    GlobalSettings.setValue(SETTING_GLOBALPALETTE, defaultGlobalPalette)
+    GlobalSettings.setValue(SETTING_PALETTEFRAMES, defaultPaletteFrames)
+    GlobalSettings.setValue(SETTING_STATSFILE, defaultStatsFile)
+    GlobalSettings.setValue(SETTING_ADAPTIVE, defaultAdaptive)
+    GlobalSettings.setValue(SETTING_FORMAT, defaultFormat)
+    GlobalSettings.setValue(SETTING_WEBPQUALITY, defaultWebPQuality)
+    GlobalSettings.setValue(SETTING_WEBPMETHOD, defaultWebPMethod)
+    GlobalSettings.setValue(SETTING_APNGCOLORS, defaultAPNGColors)
+    GlobalSettings.setValue(SETTING_APNGCOMPRESSION, defaultAPNGCompression)
+    GlobalSettings.setValue(SETTING_MP4CRF, defaultMP4Crf)
+    GlobalSettings.setValue(SETTING_MP4PRESET, defaultMP4Preset)
+    GlobalSettings.setValue(SETTING_ENCODEWORKERS, defaultEncodeWorkers)
+    GlobalSettings.setValue(SETTING_ENCODEMEMORY, defaultEncodeMemory)
+    GlobalSettings.setValue(SETTING_THUMBNAILCACHE, defaultThumbnailCache)
+    GlobalSettings.setValue(SETTING_TRANSPARENCY, defaultTransparency)
+    GlobalSettings.setValue(SETTING_TARGETSIZE, defaultTargetSize)
+    GlobalSettings.setValue(SETTING_DITHER, defaultDither)
@@ -0,0 +1,91 @@
+import time
+
+
+def frameDelays(timestamps, interval, end=None):
+    # Per-frame delays in milliseconds, rounded to the 10 ms resolution
+    # of GIF while carrying the rounding error so the total stays exact.
+    # The last frame is shown until end, or for one interval.
+    if not timestamps:
+        return []
+
+    if end is None or end <= timestamps[-1]:
+        end = timestamps[-1] + interval
+
+    ends = timestamps[1:] + [end]
+    delays = []
+    shown = 0
+    for end in ends:
+        end_cs = round((end - timestamps[0]) * 100)
+        delays.append(max(end_cs - shown, 2) * 10)
+        shown += delays[-1] // 10
+
+    return delays
+
+
+# Paces captures against absolute tick times instead of sleeping a fixed
+# interval after each frame, so processing time does not add up as drift.
+class FrameScheduler:
+
+    def __init__(self, fps):
+        self.fps = fps
+        self.interval = 1 / fps
+        self.start_time = None
+        self.tick = 0
+
+        # Deadline of tick 0, moved along when the fps changes
+        self.origin = None
+
+        # Capture time of every frame, relative to start
+        self.timestamps = []
+
+        # Ticks we reached after their deadline / ticks skipped entirely
+        self.late = 0
+        self.dropped = 0
+
+    def start(self):
+        self.start_time = self.origin = time.perf_counter()
+        self.tick = 0
+
+    def setFps(self, fps):
+        # Ticks continue from the current one at the new interval. Delays
+        # come from the capture times, so playback stays correct.
+        self.origin += self.tick * self.interval
+        self.tick = 0
+        self.fps = fps
+        self.interval = 1 / fps
+
+    def wait(self):
+        # Sleep until the next tick's deadline. If we are more than a full
+        # interval behind, skip the missed ticks instead of bursting frames.
+        self.tick += 1
+        deadline = self.origin + self.tick * self.interval
+        now = time.perf_counter()
+
+        if now > deadline:
+            self.late += 1
+            behind = int((now - deadline) / self.interval)
+            if behind:
+                self.dropped += behind
+                self.tick += behind
+            return
+
+        time.sleep(deadline - now)
+
+    def stamp(self):
+        # Record the real capture time of the frame just grabbed
+        self.timestamps.append(time.perf_counter() - self.start_time)
+
+    def delays(self):
+        return frameDelays(self.timestamps, self.interval)
+
+    def end(self):
+        # When the last tick's frame stops being shown
+        if not self.timestamps:
+            return None
+        return self.timestamps[-1] + self.interval
+
+    def report(self):
+        elapsed = self.timestamps[-1] if self.timestamps else 0
+        achieved = (len(self.timestamps) - 1) / elapsed if elapsed else 0
+        return {"frames": len(self.timestamps), "fps": round(achieved, 2),
+                "late": self.late, "dropped": self.dropped}
@@ -0,0 +1,55 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pygifsicle import gifsicle
+
+
+# Segments shorter than this cost more in process startup than they save
+MIN_SEGMENT_FRAMES = 8
+
+
+def segmentRanges(frames, segments):
+    # Splits frames into up to segments (first, last) ranges of similar length
+    count = max(min(segments, frames // MIN_SEGMENT_FRAMES), 1)
+    bounds = [round(index * frames / count) for index in range(count + 1)]
+    return [(bounds[index], bounds[index + 1] - 1) for index in range(count)]
+
+
+def optimizeSegment(path, first, last, destination, colors, options):
+    # Frames are unoptimized while being extracted, so the segment's first
+    # frame is a full image even if it was a cropped one in the source
+    subprocess.run(["gifsicle", "--unoptimize", path, f"#{first}-{last}",
+                    "--optimize", *options, "--colors", str(colors),
+                    "--output", destination], check=True)
+
+
+def optimizeSegments(path, frames, segments, colors=256, options=None):
+    # Runs gifsicle on ranges of frames at the same time, each in its own
+    # process, then merges the optimized ranges back into path. The gifsicle
+    # processes do the work, so threads are enough to drive them.
+    options = options or []
+    ranges = segmentRanges(frames, segments)
+
+    if len(ranges) == 1:
+        gifsicle(sources=path, colors=colors, optimize=True, options=options)
+        return
+
+    directory = tempfile.mkdtemp(prefix="gifcapture_")
+    try:
+        parts = [os.path.join(directory, f"segment_{index}.gif")
+                 for index in range(len(ranges))]
+
+        with ThreadPoolExecutor(len(ranges)) as pool:
+            jobs = [pool.submit(optimizeSegment, path, first, last, part, colors, options)
+                    for (first, last), part in zip(ranges, parts)]
+            for job in jobs:
+                job.result()
+
+        # Merging copies the already compressed frames, keeping their delays.
+        # All segments come from the same source colormap, so it stays global.
+        subprocess.run(["gifsicle", "--loopcount=forever", *parts,
+                        "--output", path], check=True)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
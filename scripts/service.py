@@ -0,0 +1,155 @@
+from PyQt6.QtCore import QObject, QThread, pyqtSignal
+from scripts.jobs import EncodeQueue
+import scripts.saved as settings
+
+
+IDLE = "idle"
+RECORDING = "recording"
+SAVING = "saving"
+
+REGION_KEYS = ("left", "top", "width", "height")
+
+# How long recordings started while the overlay is up wait before the first
+# grab, so the overlay is out of the picture
+OVERLAY_DELAY = 0.3
+
+
+def queueSettings():
+    workers = settings.GlobalSettings.value(
+        settings.SETTING_ENCODEWORKERS, settings.defaultEncodeWorkers, type=int)
+    memory = settings.GlobalSettings.value(
+        settings.SETTING_ENCODEMEMORY, settings.defaultEncodeMemory, type=int)
+    return workers, memory * 1024 * 1024
+
+
+def checkRegion(region):
+    try:
+        region = {key: int(region[key]) for key in REGION_KEYS}
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"A region needs integer {', '.join(REGION_KEYS)}")
+    if region["width"] < 1 or region["height"] < 1:
+        raise ValueError("A region needs a width and height of at least 1")
+    return region
+
+
+# Records screen regions and saves them through one encode queue. The
+# overlay and the control server both start and stop recordings through it.
+# Recordings run on a worker thread that stays up between them, and
+# warmUp() loads the capture and encode modules and opens the screen grabber
+# on it ahead of time, so the first recording starts right away.
+class CaptureService(QObject):
+
+    stateChanged = pyqtSignal(str)
+    regionChanged = pyqtSignal(dict)
+
+    # Live capture metrics, about once a second while recording
+    metrics = pyqtSignal(dict)
+
+    # An encode job changed status, emitted from the job's thread
+    jobChanged = pyqtSignal(object)
+
+    # Run on the worker thread
+    recordRequested = pyqtSignal(dict, float)
+    warmUpRequested = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self.state = IDLE
+        self.region = None
+        self.path = None
+        self.last_metrics = None
+        self.start_delay = 0
+
+        self.jobs = EncodeQueue(*queueSettings(), self.jobChanged.emit)
+        self.thread = None
+        self.worker = None
+
+    def startWorker(self):
+        if self.worker:
+            return
+
+        from scripts.thread import GifThread
+        self.thread = QThread()
+        self.worker = GifThread(self.jobs)
+        self.worker.moveToThread(self.thread)
+        self.recordRequested.connect(self.worker.run)
+        self.warmUpRequested.connect(self.worker.prepare)
+        self.worker.started.connect(self.recordingStarted)
+        self.worker.startSaving.connect(self.savingStarted)
+        self.worker.metrics.connect(self.metricsReported)
+        self.worker.finished.connect(self.recordingFinished)
+        self.thread.start()
+
+    def warmUp(self):
+        self.startWorker()
+        self.warmUpRequested.emit()
+
+    def start(self, region=None):
+        if self.state != IDLE:
+            raise RuntimeError(f"Can't start while {self.state}")
+        if region is not None:
+            self.setRegion(region)
+        if not self.region:
+            raise ValueError("No region selected")
+
+        self.startWorker()
+        self.worker.stopped = False
+        self.path = None
+        self.last_metrics = None
+        self.setState(RECORDING)
+        self.recordRequested.emit(self.region, self.start_delay)
+
+    def stop(self):
+        if self.state != RECORDING:
+            raise RuntimeError("Not recording")
+        self.worker.stopped = True
+
+    def toggle(self):
+        if self.state == RECORDING:
+            self.stop()
+        else:
+            self.start()
+
+    def setRegion(self, region):
+        if self.state == RECORDING:
+            raise RuntimeError("Can't change the region while recording")
+        self.region = checkRegion(region)
+        self.regionChanged.emit(self.region)
+
+    def status(self):
+        return {
+            "state": self.state,
+            "region": self.region,
+            "path": self.path,
+            "metrics": self.last_metrics,
+            "jobs": [{"name": job.name, "status": job.status}
+                     for job in self.jobs.jobs()],
+        }
+
+    def configure(self):
+        self.jobs.configure(*queueSettings())
+
+    def shutdown(self):
+        # Stops a running recording and the worker thread. Saves still in the
+        # queue finish before the process exits.
+        if self.worker:
+            self.worker.stopped = True
+            self.thread.quit()
+            self.thread.wait()
+
+    def setState(self, state):
+        self.state = state
+        self.stateChanged.emit(state)
+
+    def recordingStarted(self, path):
+        self.path = path
+
+    def savingStarted(self):
+        self.setState(SAVING)
+
+    def metricsReported(self, metrics):
+        self.last_metrics = metrics
+        self.metrics.emit(metrics)
+
+    def recordingFinished(self):
+        self.setState(IDLE)
@@ -3,6 +3,7 @@ from PyQt6.QtCore import Qt, QSize, QKeyCombination, pyqtSignal
 from PyQt6.QtGui import QPalette
 import PyQt6.QtWidgets as wgs
 import scripts.saved as settings
+from scripts.formats import MP4_PRESETS, ffmpegAvailable
 
 
 FONT_SIZE = "12pt"
@@ -23,6 +24,12 @@ class SettingWindow(wgs.QDialog):
             settings.SETTING_OPTIMIZING, defaultValue=default, type=bool)
         self.optimizing_group.setChecked(current)
 
+    def updateFormat(self, format):
+        # The optimization settings are for GIF only
+        self.optimizing_group.setEnabled(format == "gif")
+        for option in self.format_options:
+            option.setActive(option.format == format)
+
     def __init__(self):
         super().__init__()
 
@@ -36,13 +43,17 @@ class SettingWindow(wgs.QDialog):
         self.optimizing_group_layout = wgs.QVBoxLayout()
 
         # Settings Elements
-        resolution = Resolution(self)
         fps = FPS(self)
         compression = Compression(self)
+        colors = Colors(self)
+        optimizer = Optimizer(self)
+        segments = Segments(self)
 
-        self.optimizing_group_layout.addItem(resolution)
         self.optimizing_group_layout.addItem(fps)
         self.optimizing_group_layout.addItem(compression)
+        self.optimizing_group_layout.addItem(colors)
+        self.optimizing_group_layout.addItem(optimizer)
+        self.optimizing_group_layout.addItem(segments)
         self.optimizing_group_layout.setSpacing(20)
 
         self.optimizing_group = SettingsGroup("Optimization")
@@ -50,17 +61,71 @@ class SettingWindow(wgs.QDialog):
         self.refreshOptimize()
         self.optimizing_group.setLayout(self.optimizing_group_layout)
 
+        # Output Group
+        self.output_group_layout = wgs.QVBoxLayout()
+
+        # Settings Elements
+        output_format = OutputFormat(self)
+        self.format_options = [
+            TargetSize(self),
+            WebPQuality(self),
+            WebPMethod(self),
+            APNGColors(self),
+            APNGCompression(self),
+            MP4Quality(self),
+            MP4Preset(self),
+        ]
+
+        self.output_group_layout.addItem(output_format)
+        for option in self.format_options:
+            self.output_group_layout.addItem(option)
+        self.output_group_layout.setSpacing(20)
+
+        self.output_group = SettingsGroup("Output")
+        self.output_group.setLayout(self.output_group_layout)
+
+        # Only the chosen format's options apply
+        output_format.combobox.currentIndexChanged.connect(
+            lambda: self.updateFormat(output_format.combobox.currentData()))
+        self.updateFormat(output_format.combobox.currentData())
+
         # General Group
         self.general_group_layout = wgs.QVBoxLayout()
 
         # Settings Elements
+        resolution = Resolution(self)
+        resample = Resample(self)
         starup = StartupLaunch(self)
         shortcut = Shortcut(self)
         saveDir = SaveDirectory(self)
+        streaming = StreamingEncode(self)
+        workers = ConversionWorkers(self)
+        backpressure = Backpressure(self)
+        storage = FrameStorage(self)
+        palette = GlobalPalette(self)
+        transparency = Transparency(self)
+        dither = Dither(self)
+        stats = StatsFile(self)
+        encode_queue = EncodeQueueSettings(self)
+        adaptive = AdaptiveCapture(self)
+        thumbnails = ThumbnailCacheSize(self)
 
         # self.general_group_layout.addItem(starup)
-        # self.general_group_layout.addItem(shortcut)
+        self.general_group_layout.addItem(shortcut)
+        self.general_group_layout.addItem(resolution)
+        self.general_group_layout.addItem(resample)
         self.general_group_layout.addItem(saveDir)
+        self.general_group_layout.addItem(streaming)
+        self.general_group_layout.addItem(workers)
+        self.general_group_layout.addItem(backpressure)
+        self.general_group_layout.addItem(storage)
+        self.general_group_layout.addItem(palette)
+        self.general_group_layout.addItem(transparency)
+        self.general_group_layout.addItem(dither)
+        self.general_group_layout.addItem(encode_queue)
+        self.general_group_layout.addItem(adaptive)
+        self.general_group_layout.addItem(stats)
+        self.general_group_layout.addItem(thumbnails)
         self.general_group = SettingsGroup("General")
         self.general_group_layout.setSpacing(20)
         self.general_group.setLayout(self.general_group_layout)
@@ -70,6 +135,7 @@ class SettingWindow(wgs.QDialog):
         self.footer = FooterButtons(self)
         self.layout.setSpacing(30)
         self.layout.addWidget(self.optimizing_group)
+        self.layout.addWidget(self.output_group)
         self.layout.addWidget(self.general_group)
         self.layout.addStretch(1)
         self.layout.addItem(self.footer)
@@ -163,6 +229,38 @@ class Resolution(wgs.QHBoxLayout):
         self.slider.slider.setValue(round(current*100))
 
 
+class Resample(wgs.QHBoxLayout):
+    def __init__(self, window: SettingWindow):
+        super().__init__()
+
+        window.refresh.connect(self.refresh)
+        window.save.connect(self.save)
+
+        text = SettingsLabel("Scaling filter:")
+        self.combobox = wgs.QComboBox()
+        self.combobox.addItem("Nearest", "nearest")
+        self.combobox.addItem("Box", "box")
+        self.combobox.addItem("Bilinear", "bilinear")
+        self.combobox.addItem("Bicubic", "bicubic")
+        self.combobox.addItem("Lanczos", "lanczos")
+
+        self.refresh()
+
+        self.addWidget(text)
+        self.addStretch(1)
+        self.addWidget(self.combobox)
+
+    def save(self):
+        current = self.combobox.currentData()
+        settings.GlobalSettings.setValue(settings.SETTING_RESAMPLE, current)
+
+    def refresh(self):
+        default = settings.defaultResample
+        current = settings.GlobalSettings.value(
+            settings.SETTING_RESAMPLE, defaultValue=default)
+        self.combobox.setCurrentIndex(max(self.combobox.findData(current), 0))
+
+
 class FPS(wgs.QHBoxLayout):
     def __init__(self, window: SettingWindow):
         super().__init__()
@@ -217,6 +315,93 @@ class Compression(wgs.QHBoxLayout):
         self.slider.slider.setValue(current)
 
 
+class Colors(wgs.QHBoxLayout):
+    def __init__(self, window: SettingWindow):
+        super().__init__()
+
+        window.refresh.connect(self.refresh)
+        window.save.connect(self.save)
+
+        text = SettingsLabel("Colors:")
+        self.slider = SettingsSlider(2, 256, 2, "")
+
+        self.refresh()
+
+        self.addWidget(text)
+        self.addStretch(1)
+        self.addWidget(self.slider)
+
+    def save(self):
+        current = self.slider.slider.value()
+        settings.GlobalSettings.setValue(settings.SETTING_COLORS, current)
+
+    def refresh(self):
+        default = settings.defaultColors
+        current = settings.GlobalSettings.value(
+            settings.SETTING_COLORS, defaultValue=default, type=int)
+        self.slider.slider.setValue(current)
+
+
+class Optimizer(wgs.QHBoxLayout):
+    def __init__(self, window: SettingWindow):
+        super().__init__()
+
+        window.refresh.connect(self.refresh)
+        window.save.connect(self.save)
+
+        text = SettingsLabel("Optimizer:")
+        self.combobox = wgs.QComboBox()
+        self.combobox.addItem("gifsicle", "gifsicle")
+        self.combobox.addItem("Built-in", "builtin")
+
+        self.refresh()
+
+        self.addWidget(text)
+        self.addStretch(1)
+        self.addWidget(self.combobox)
+
+    def save(self):
+        current = self.combobox.currentData()
+        settings.GlobalSettings.setValue(settings.SETTING_OPTIMIZER, current)
+
+    def refresh(self):
+        default = settings.defaultOptimizer
+        current = settings.GlobalSettings.value(
+            settings.SETTING_OPTIMIZER, defaultValue=default)
+        self.combobox.setCurrentIndex(max(self.combobox.findData(current), 0))
+
+
+class Segments(wgs.QHBoxLayout):
+    def __init__(self, window: SettingWindow):
+        super().__init__()
+
+        window.refresh.connect(self.refresh)
+        window.save.connect(self.save)
+
+        text = SettingsLabel("Parallel gifsicle segments:")
+        self.spinbox = SettingsSpinBox(1, 64, 1, "")
+        self.spinbox.setToolTip(
+            "More than 1 optimizes ranges of frames at the same time. With "
+            "lossy compression, frames where the ranges meet come out "
+            "differently than from a single gifsicle run.")
+
+        self.refresh()
+
+        self.addWidget(text)
+        self.addStretch(1)
+        self.addWidget(self.spinbox)
+
+    def save(self):
+        current = self.spinbox.value()
+        settings.GlobalSettings.setValue(settings.SETTING_SEGMENTS, current)
+
+    def refresh(self):
+        default = settings.defaultSegments
+        current = settings.GlobalSettings.value(
+            settings.SETTING_SEGMENTS, defaultValue=default, type=int)
+        self.spinbox.setValue(current)
+
+
 class Shortcut(wgs.QHBoxLayout):
     def __init__(self, window: SettingWindow):
         super().__init__()
@@ -320,6 +505,540 @@ class StartupLaunch(wgs.QHBoxLayout):
         self.checkbox.setChecked(current)
 
 
+class StreamingEncode(wgs.QHBoxLayout):
+    def __init__(self, window: SettingWindow):
+        super().__init__()
+
+        window.refresh.connect(self.refresh)
+        window.save.connect(self.save)
+
+        text = SettingsLabel("Encode while recording:")
+
+        self.checkbox = wgs.QCheckBox()
+
+        self.refresh()
+
+        self.addWidget(text)
+        self.addStretch(1)
+        self.addWidget(self.checkbox)
+
+    def save(self):
+        current = self.checkbox.isChecked()
+        settings.GlobalSettings.setValue(settings.SETTING_STREAMING, current)
+
+    def refresh(self):
+        default = settings.defaultStreaming
+        current = settings.GlobalSettings.value(
+            settings.SETTING_STREAMING, defaultValue=default, type=bool)
+        self.checkbox.setChecked(current)
+
+
+class ConversionWorkers(wgs.QHBoxLayout):
+    def __init__(self, window: SettingWindow):
+        super().__init__()
+
+        window.refresh.connect(self.refresh)
+        window.save.connect(self.save)
+
+        text = SettingsLabel("Conversion threads:")
+        self.spinbox = SettingsSpinBox(1, 16, 1, "")
+
+        self.refresh()
+
+        self.addWidget(text)
+        self.addStretch(1)
+        self.addWidget(self.spinbox)
+
+    def save(self):
+        current = self.spinbox.value()
+        settings.GlobalSettings.setValue(settings.SETTING_WORKERS, current)
+
+    def refresh(self):
+        default = settings.defaultWorkers
+        current = settings.GlobalSettings.value(
+            settings.SETTING_WORKERS, defaultValue=default, type=int)
+        self.spinbox.setValue(current)
+
+
+class Backpressure(wgs.QHBoxLayout):
+    def __init__(self, window: SettingWindow):
+        super().__init__()
+
+        window.refresh.connect(self.refresh)
+        window.save.connect(self.save)
+
+        text = SettingsLabel("When conversion falls behind:")
+        self.combobox = wgs.QComboBox()
+        self.combobox.addItem("Wait", "block")
+        self.combobox.addItem("Drop oldest frame", "drop_oldest")
+        self.combobox.addItem("Drop newest frame", "drop_newest")
+
+        self.refresh()
+
+        self.addWidget(text)
+        self.addStretch(1)
+        self.addWidget(self.combobox)
+
+    def save(self):
+        current = self.combobox.currentData()
+        settings.GlobalSettings.setValue(settings.SETTING_BACKPRESSURE, current)
+
+    def refresh(self):
+        default = settings.defaultBackpressure
+        current = settings.GlobalSettings.value(
+            settings.SETTING_BACKPRESSURE, defaultValue=default)
+        self.combobox.setCurrentIndex(max(self.combobox.findData(current), 0))
+
+
+class FrameStorage(wgs.QHBoxLayout):
+    def __init__(self, window: SettingWindow):
+        super().__init__()
+
+        window.refresh.connect(self.refresh)
+        window.save.connect(self.save)
+
+        text = SettingsLabel("Keep frames in:")
+        self.combobox = wgs.QComboBox()
+        self.combobox.addItem("Memory", "memory")
+        self.combobox.addItem("Temp folder", "temp")
+        self.combobox.addItem("Save folder", "save")
+        self.limit = SettingsSpinBox(64, 65536, 64, " MB")
+        self.limit.setFixedWidth(150)
+
+        self.refresh()
+
+        self.addWidget(text)
+        self.addStretch(1)
+        self.addWidget(self.combobox)
+        self.addWidget(self.limit)
+
+    def save(self):
+        current = self.combobox.currentData()
+        settings.GlobalSettings.setValue(settings.SETTING_FRAMESTORAGE, current)
+        settings.GlobalSettings.setValue(
+            settings.SETTING_SPOOLLIMIT, self.limit.value())
+
+    def refresh(self):
+        default = settings.defaultFrameStorage
+        current = settings.GlobalSettings.value(
+            settings.SETTING_FRAMESTORAGE, defaultValue=default)
+        self.combobox.setCurrentIndex(max(self.combobox.findData(current), 0))
+
+        default = settings.defaultSpoolLimit
+        current = settings.GlobalSettings.value(
+            settings.SETTING_SPOOLLIMIT, defaultValue=default, type=int)
+        self.limit.setValue(current)
+
+
+class EncodeQueueSettings(wgs.QHBoxLayout):
+    def __init__(self, window: SettingWindow):
+        super().__init__()
+
+        window.refresh.connect(self.refresh)
+        window.save.connect(self.save)
+
+        text = SettingsLabel("Save in background, threads / memory:")
+        self.workers = SettingsSpinBox(1, 8, 1, "")
+        self.memory = SettingsSpinBox(64, 65536, 64, " MB")
+        self.memory.setFixedWidth(150)
+
+        self.refresh()
+
+        self.addWidget(text)
+        self.addStretch(1)
+        self.addWidget(self.workers)
+        self.addWidget(self.memory)
+
+    def save(self):
+        settings.GlobalSettings.setValue(
+            settings.SETTING_ENCODEWORKERS, self.workers.value())
+        settings.GlobalSettings.setValue(
+            settings.SETTING_ENCODEMEMORY, self.memory.value())
+
+    def refresh(self):
+        default = settings.defaultEncodeWorkers
+        current = settings.GlobalSettings.value(
+            settings.SETTING_ENCODEWORKERS, defaultValue=default, type=int)
+        self.workers.setValue(current)
+
+        default = settings.defaultEncodeMemory
+        current = settings.GlobalSettings.value(
+            settings.SETTING_ENCODEMEMORY, defaultValue=default, type=int)
+        self.memory.setValue(current)
+
+
+class GlobalPalette(wgs.QHBoxLayout):
+    def __init__(self, window: SettingWindow):
+        super().__init__()
+
+        window.refresh.connect(self.refresh)
+        window.save.connect(self.save)
+
+        text = SettingsLabel("Shared palette from frames:")
+
+        self.checkbox = wgs.QCheckBox()
+        self.frames = SettingsSpinBox(1, 100, 1, "")
+
+        self.refresh()
+
+        self.addWidget(text)
+        self.addStretch(1)
+        self.addWidget(self.checkbox)
+        self.addWidget(self.frames)
+
+    def save(self):
+        settings.GlobalSettings.setValue(
+            settings.SETTING_GLOBALPALETTE, self.checkbox.isChecked())
+        settings.GlobalSettings.setValue(
+            settings.SETTING_PALETTEFRAMES, self.frames.value())
+
+    def refresh(self):
+        default = settings.defaultGlobalPalette
+        current = settings.GlobalSettings.value(
+            settings.SETTING_GLOBALPALETTE, defaultValue=default, type=bool)
+        self.checkbox.setChecked(current)
+
+        default = settings.defaultPaletteFrames
+        current = settings.GlobalSettings.value(
+            settings.SETTING_PALETTEFRAMES, defaultValue=default, type=int)
+        self.frames.setValue(current)
+
+
+class Transparency(wgs.QHBoxLayout):
+    def __init__(self, window: SettingWindow):
+        super().__init__()
+
+        window.refresh.connect(self.refresh)
+        window.save.connect(self.save)
+
+        text = SettingsLabel("Unchanged pixels transparent (shared palette):")
+        self.checkbox = wgs.QCheckBox()
+
+        self.refresh()
+
+        self.addWidget(text)
+        self.addStretch(1)
+        self.addWidget(self.checkbox)
+
+    def save(self):
+        current = self.checkbox.isChecked()
+        settings.GlobalSettings.setValue(settings.SETTING_TRANSPARENCY, current)
+
+    def refresh(self):
+        default = settings.defaultTransparency
+        current = settings.GlobalSettings.value(
+            settings.SETTING_TRANSPARENCY, defaultValue=default, type=bool)
+        self.checkbox.setChecked(current)
+
+
+class Dither(wgs.QHBoxLayout):
+    def __init__(self, window: SettingWindow):
+        super().__init__()
+
+        window.refresh.connect(self.refresh)
+        window.save.connect(self.save)
+
+        text = SettingsLabel("Dithering:")
+        self.combobox = wgs.QComboBox()
+        self.combobox.addItem("None", "none")
+        self.combobox.addItem("Ordered (compresses well)", "ordered")
+        self.combobox.addItem("Error diffusion", "diffusion")
+
+        self.refresh()
+
+        self.addWidget(text)
+        self.addStretch(1)
+        self.addWidget(self.combobox)
+
+    def save(self):
+        current = self.combobox.currentData()
+        settings.GlobalSettings.setValue(settings.SETTING_DITHER, current)
+
+    def refresh(self):
+        default = settings.defaultDither
+        current = settings.GlobalSettings.value(
+            settings.SETTING_DITHER, defaultValue=default)
+        self.combobox.setCurrentIndex(max(self.combobox.findData(current), 0))
+
+
+class AdaptiveCapture(wgs.QHBoxLayout):
+    def __init__(self, window: SettingWindow):
+        super().__init__()
+
+        window.refresh.connect(self.refresh)
+        window.save.connect(self.save)
+
+        text = SettingsLabel("Lower fps/scale under load:")
+
+        self.checkbox = wgs.QCheckBox()
+
+        self.refresh()
+
+        self.addWidget(text)
+        self.addStretch(1)
+        self.addWidget(self.checkbox)
+
+    def save(self):
+        current = self.checkbox.isChecked()
+        settings.GlobalSettings.setValue(settings.SETTING_ADAPTIVE, current)
+
+    def refresh(self):
+        default = settings.defaultAdaptive
+        current = settings.GlobalSettings.value(
+            settings.SETTING_ADAPTIVE, defaultValue=default, type=bool)
+        self.checkbox.setChecked(current)
+
+
+class OutputFormat(wgs.QHBoxLayout):
+    def __init__(self, window: SettingWindow):
+        super().__init__()
+
+        window.refresh.connect(self.refresh)
+        window.save.connect(self.save)
+
+        text = SettingsLabel("Format:")
+        self.combobox = wgs.QComboBox()
+        self.combobox.addItem("GIF", "gif")
+        self.combobox.addItem("Animated WebP", "webp")
+        self.combobox.addItem("APNG", "apng")
+        if ffmpegAvailable():
+            self.combobox.addItem("MP4 (H.264)", "mp4")
+
+        self.refresh()
+
+        self.addWidget(text)
+        self.addStretch(1)
+        self.addWidget(self.combobox)
+
+    def save(self):
+        current = self.combobox.currentData()
+        settings.GlobalSettings.setValue(settings.SETTING_FORMAT, current)
+
+    def refresh(self):
+        default = settings.defaultFormat
+        current = settings.GlobalSettings.value(
+            settings.SETTING_FORMAT, defaultValue=default)
+        self.combobox.setCurrentIndex(max(self.combobox.findData(current), 0))
+
+
+# A setting of one output format, greyed out while another format is chosen
+class FormatOption(wgs.QHBoxLayout):
+
+    format = None
+
+    def __init__(self, window: SettingWindow, label, widget):
+        super().__init__()
+
+        window.refresh.connect(self.refresh)
+        window.save.connect(self.save)
+
+        self.text = SettingsLabel(label)
+        self.widget = widget
+
+        self.refresh()
+
+        self.addWidget(self.text)
+        self.addStretch(1)
+        self.addWidget(self.widget)
+
+    def setActive(self, active):
+        self.text.setEnabled(active)
+        self.widget.setEnabled(active)
+
+
+class TargetSize(FormatOption):
+
+    format = "gif"
+
+    def __init__(self, window: SettingWindow):
+        self.spinbox = SettingsSpinBox(0, 1024, 0, " MB")
+        self.spinbox.setSpecialValueText("Off")
+        super().__init__(window, "Fit GIFs under:", self.spinbox)
+
+    def save(self):
+        current = self.spinbox.value()
+        settings.GlobalSettings.setValue(settings.SETTING_TARGETSIZE, current)
+
+    def refresh(self):
+        default = settings.defaultTargetSize
+        current = settings.GlobalSettings.value(
+            settings.SETTING_TARGETSIZE, defaultValue=default, type=int)
+        self.spinbox.setValue(current)
+
+
+class WebPQuality(FormatOption):
+
+    format = "webp"
+
+    def __init__(self, window: SettingWindow):
+        self.slider = SettingsSlider(0, 100, 80, "")
+        super().__init__(window, "WebP quality (100 is lossless):", self.slider)
+
+    def save(self):
+        current = self.slider.slider.value()
+        settings.GlobalSettings.setValue(settings.SETTING_WEBPQUALITY, current)
+
+    def refresh(self):
+        default = settings.defaultWebPQuality
+        current = settings.GlobalSettings.value(
+            settings.SETTING_WEBPQUALITY, defaultValue=default, type=int)
+        self.slider.slider.setValue(current)
+
+
+class WebPMethod(FormatOption):
+
+    format = "webp"
+
+    def __init__(self, window: SettingWindow):
+        self.spinbox = SettingsSpinBox(0, 6, 4, "")
+        super().__init__(window, "WebP effort (0 fast, 6 small):", self.spinbox)
+
+    def save(self):
+        current = self.spinbox.value()
+        settings.GlobalSettings.setValue(settings.SETTING_WEBPMETHOD, current)
+
+    def refresh(self):
+        default = settings.defaultWebPMethod
+        current = settings.GlobalSettings.value(
+            settings.SETTING_WEBPMETHOD, defaultValue=default, type=int)
+        self.spinbox.setValue(current)
+
+
+class APNGColors(FormatOption):
+
+    format = "apng"
+
+    def __init__(self, window: SettingWindow):
+        self.spinbox = SettingsSpinBox(0, 256, 256, "")
+        self.spinbox.setSpecialValueText("Full")
+        super().__init__(window, "APNG colors:", self.spinbox)
+
+    def save(self):
+        current = self.spinbox.value()
+        settings.GlobalSettings.setValue(settings.SETTING_APNGCOLORS, current)
+
+    def refresh(self):
+        default = settings.defaultAPNGColors
+        current = settings.GlobalSettings.value(
+            settings.SETTING_APNGCOLORS, defaultValue=default, type=int)
+        self.spinbox.setValue(current)
+
+
+class APNGCompression(FormatOption):
+
+    format = "apng"
+
+    def __init__(self, window: SettingWindow):
+        self.spinbox = SettingsSpinBox(0, 9, 6, "")
+        super().__init__(window, "APNG compression (0 fast, 9 small):", self.spinbox)
+
+    def save(self):
+        current = self.spinbox.value()
+        settings.GlobalSettings.setValue(settings.SETTING_APNGCOMPRESSION, current)
+
+    def refresh(self):
+        default = settings.defaultAPNGCompression
+        current = settings.GlobalSettings.value(
+            settings.SETTING_APNGCOMPRESSION, defaultValue=default, type=int)
+        self.spinbox.setValue(current)
+
+
+class MP4Quality(FormatOption):
+
+    format = "mp4"
+
+    def __init__(self, window: SettingWindow):
+        self.spinbox = SettingsSpinBox(0, 51, 23, "")
+        super().__init__(window, "MP4 CRF (lower is better):", self.spinbox)
+
+    def save(self):
+        current = self.spinbox.value()
+        settings.GlobalSettings.setValue(settings.SETTING_MP4CRF, current)
+
+    def refresh(self):
+        default = settings.defaultMP4Crf
+        current = settings.GlobalSettings.value(
+            settings.SETTING_MP4CRF, defaultValue=default, type=int)
+        self.spinbox.setValue(current)
+
+
+class MP4Preset(FormatOption):
+
+    format = "mp4"
+
+    def __init__(self, window: SettingWindow):
+        self.combobox = wgs.QComboBox()
+        for preset in MP4_PRESETS:
+            self.combobox.addItem(preset.capitalize(), preset)
+        super().__init__(window, "MP4 speed:", self.combobox)
+
+    def save(self):
+        current = self.combobox.currentData()
+        settings.GlobalSettings.setValue(settings.SETTING_MP4PRESET, current)
+
+    def refresh(self):
+        default = settings.defaultMP4Preset
+        current = settings.GlobalSettings.value(
+            settings.SETTING_MP4PRESET, defaultValue=default)
+        self.combobox.setCurrentIndex(max(self.combobox.findData(current), 0))
+
+
+class StatsFile(wgs.QHBoxLayout):
+    def __init__(self, window: SettingWindow):
+        super().__init__()
+
+        window.refresh.connect(self.refresh)
+        window.save.connect(self.save)
+
+        text = SettingsLabel("Write stats file:")
+
+        self.checkbox = wgs.QCheckBox()
+
+        self.refresh()
+
+        self.addWidget(text)
+        self.addStretch(1)
+        self.addWidget(self.checkbox)
+
+    def save(self):
+        current = self.checkbox.isChecked()
+        settings.GlobalSettings.setValue(settings.SETTING_STATSFILE, current)
+
+    def refresh(self):
+        default = settings.defaultStatsFile
+        current = settings.GlobalSettings.value(
+            settings.SETTING_STATSFILE, defaultValue=default, type=bool)
+        self.checkbox.setChecked(current)
+
+
+class ThumbnailCacheSize(wgs.QHBoxLayout):
+    def __init__(self, window: SettingWindow):
+        super().__init__()
+
+        window.refresh.connect(self.refresh)
+        window.save.connect(self.save)
+
+        text = SettingsLabel("Thumbnail cache size:")
+        self.spinbox = SettingsSpinBox(1, 4096, 1, " MB")
+        self.spinbox.setFixedWidth(150)
+
+        self.refresh()
+
+        self.addWidget(text)
+        self.addStretch(1)
+        self.addWidget(self.spinbox)
+
+    def save(self):
+        settings.GlobalSettings.setValue(
+            settings.SETTING_THUMBNAILCACHE, self.spinbox.value())
+
+    def refresh(self):
+        default = settings.defaultThumbnailCache
+        current = settings.GlobalSettings.value(
+            settings.SETTING_THUMBNAILCACHE, defaultValue=default, type=int)
+        self.spinbox.setValue(current)
+
+
 class SettingsButton(wgs.QPushButton):
     def __init__(self, text: str):
         super().__init__()
@@ -0,0 +1,75 @@
+import mmap
+import os
+import tempfile
+import numpy as np
+
+
+class SpoolFull(Exception):
+    pass
+
+
+# Keeps captured frames on disk instead of in memory. Frames are appended to
+# a spool file while recording and read back one at a time through a memory
+# map when encoding, so memory use doesn't grow with the recording length.
+class FrameSpool:
+
+    def __init__(self, directory=None, limit=None):
+        self.limit = limit
+        self.file = tempfile.NamedTemporaryFile(
+            dir=directory, prefix="gifcapture_", suffix=".spool", delete=False)
+        self.path = self.file.name
+        self.map = None
+
+        # (position, length, shape, offset) of each frame
+        self.frames = []
+        self.timestamps = []
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def append(self, frame, timestamp, offset=(0, 0)):
+        # Frame is a uint8 array, written straight from its memory
+        data = np.ascontiguousarray(frame)
+
+        if self.limit and self.bytes + data.nbytes > self.limit:
+            raise SpoolFull(f"Frame spool reached {self.limit} bytes")
+
+        self.file.write(data)
+        self.frames.append((self.bytes, data.nbytes, data.shape, offset))
+        self.timestamps.append(timestamp)
+        self.bytes += data.nbytes
+
+    def finish(self):
+        # Done appending, map the file for reading
+        self.file.flush()
+        if self.bytes:
+            self.map = mmap.mmap(self.file.fileno(), self.bytes,
+                                 access=mmap.ACCESS_READ)
+
+    def read(self, index):
+        # Returns (frame, offset) of a frame
+        position, length, shape, offset = self.frames[index]
+        frame = np.frombuffer(self.map[position:position + length],
+                              dtype=np.uint8).reshape(shape)
+
+        # Let the OS drop the pages we just read
+        if hasattr(mmap, "MADV_DONTNEED"):
+            start = position - position % mmap.PAGESIZE
+            self.map.madvise(mmap.MADV_DONTNEED, start,
+                             position + length - start)
+
+        return frame, offset
+
+    def __getitem__(self, index):
+        return self.read(index)
+
+    def __iter__(self):
+        for index in range(len(self.frames)):
+            yield self.read(index)
+
+    def close(self):
+        if self.map:
+            self.map.close()
+        self.file.close()
+        os.remove(self.path)
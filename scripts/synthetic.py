@@ -0,0 +1,104 @@
+import numpy as np
+from scripts.backends import CaptureBackend
+
+
+KINDS = ["static", "desktop", "scroll", "noise", "gradient"]
+
+
+# Deterministic BGRA frames in place of the screen, so the pipeline can be
+# measured without a display
+class SyntheticBackend(CaptureBackend):
+
+    def __init__(self, kind="static", seed=0):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown synthetic frame kind: {kind}")
+
+        self.kind = kind
+        self.seed = seed
+        self.frames = 0
+
+    def open(self, region):
+        self.prepare((region["width"], region["height"]))
+
+    def grabInto(self, buffer=None):
+        frame = getattr(self, self.kind)(self.frames)
+        self.frames += 1
+
+        if buffer is None:
+            return bytearray(frame.tobytes())
+
+        np.copyto(np.frombuffer(buffer, dtype=np.uint8).reshape(frame.shape), frame)
+        return buffer
+
+    def prepare(self, size):
+        # Build everything expensive once, so grabbing costs about a copy
+        width, height = size
+        self.size = size
+        rng = np.random.default_rng(self.seed)
+
+        # Static UI: panels and buttons on a flat background
+        ui = np.full((height, width, 4), 240, dtype=np.uint8)
+        ui[:max(height // 12, 1)] = (200, 120, 40, 255)
+        for _ in range(12):
+            x, y = rng.integers(0, width), rng.integers(0, height)
+            w, h = rng.integers(20, max(width // 3, 21)), rng.integers(10, max(height // 6, 11))
+            ui[y:y + h, x:x + w] = rng.integers(0, 255, 4)
+        self.ui = ui
+
+        # Text: rows of glyph-like dark blocks, twice as tall to scroll
+        text = np.full((height * 2, width, 4), 255, dtype=np.uint8)
+        glyphs = rng.random((height * 2 // 4, width // 3)) < 0.35
+        glyphs[::5] = False
+        glyphs = glyphs.repeat(4, axis=0).repeat(3, axis=1)
+        text[:glyphs.shape[0], :glyphs.shape[1]][glyphs] = (30, 30, 30, 255)
+        self.text = text
+
+        # A few noise frames to cycle through
+        self.noise_frames = [rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+                             for _ in range(4)]
+
+        # A horizontal gradient twice as wide, slid across the frame
+        ramp = np.linspace(0, 255, width * 2).astype(np.uint8)
+        vertical = np.linspace(0, 255, height).astype(np.uint8)
+        gradient = np.empty((height, width * 2, 4), dtype=np.uint8)
+        gradient[..., 0] = ramp[None, :]
+        gradient[..., 1] = vertical[:, None]
+        gradient[..., 2] = 255 - ramp[None, :]
+        gradient[..., 3] = 255
+        self.gradient_frame = gradient
+
+    def static(self, index):
+        # Mostly static, with a blinking cursor
+        frame = self.ui.copy()
+        if index // 8 % 2 == 0:
+            width, height = self.size
+            frame[height // 2:height // 2 + 16, width // 2:width // 2 + 2] = 0
+        return frame
+
+    def desktop(self, index):
+        # Small changes far apart: a moving cursor, a line being typed and a
+        # clock, so the changed area spans most of the frame
+        frame = self.ui.copy()
+        width, height = self.size
+        x = index * 13 % max(width - 12, 1)
+        y = index * 7 % max(height - 20, 1)
+        frame[y:y + 20, x:x + 12] = 0
+
+        typed = index * 3 % max(width // 3, 1)
+        frame[height // 3:height // 3 + 14, 40:40 + typed * 3:3] = (30, 30, 30, 255)
+
+        frame[height - 20:height - 4, width - 60:width - 4] = index * 5 % 255
+        return frame
+
+    def scroll(self, index):
+        height = self.size[1]
+        top = index * 4 % height
+        return self.text[top:top + height]
+
+    def noise(self, index):
+        return self.noise_frames[index % len(self.noise_frames)]
+
+    def gradient(self, index):
+        width = self.size[0]
+        left = index * 8 % width
+        return self.gradient_frame[:, left:left + width]
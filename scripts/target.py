@@ -0,0 +1,336 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+from scripts.encoder import GifEncoder, FrameIndexer, encodeFrames, writeFrames
+from scripts.optimizer import FrameOptimizer
+from scripts.palette import buildPalette
+from scripts.pipeline import RESAMPLING
+from scripts.scheduler import frameDelays
+
+
+# Trial encodes run on this many stretches of the recording, each this many
+# frames long at the fps tried. Recordings shorter than all of them together
+# at the lowest fps are tried in full.
+SAMPLE_WINDOWS = 4
+WINDOW_FRAMES = 16
+
+# Frames from the start of each stretch don't count towards the estimate.
+# Right after a full frame the lossy optimizer's picture of the screen is
+# still close, and frames come out smaller than they will further in.
+WARMUP_FRAMES = 6
+
+# Estimates have to come in this far under the limit, they are off by a few
+# percent on long recordings
+MARGIN = 0.9
+
+# Values each parameter steps down through. Scale is relative to the
+# captured frames, a step of n keeps at most one frame per n intervals.
+SCALES = [1, 0.85, 0.7, 0.6, 0.5, 0.42, 0.35, 0.3, 0.25]
+LOSSINESS = [60, 100, 140]
+COLORS = [128, 64, 32]
+STEPS = [1, 2, 3, 4]
+
+# Which parameter gives next on the way down. Lossiness and colors go first,
+# they are the hardest to see, and fps last.
+ORDER = ["lossiness", "scale", "colors", "scale", "lossiness", "scale", "step",
+         "scale", "colors", "lossiness", "scale", "step", "scale", "colors",
+         "step", "scale", "scale"]
+
+
+class FitParameters:
+
+    def __init__(self, scale=1, lossiness=0, colors=256, step=1):
+        self.scale = scale
+        self.lossiness = lossiness
+        self.colors = colors
+        self.step = step
+
+    def __repr__(self):
+        return (f"FitParameters(scale={self.scale}, lossiness={self.lossiness}, "
+                f"colors={self.colors}, step={self.step})")
+
+
+def parameterLadder(lossiness=0, colors=256):
+    # Parameters from the recording's own settings down to the smallest
+    # output, each one lowering a single parameter from the one before, so
+    # sizes shrink along the ladder
+    values = {
+        "scale": SCALES,
+        "lossiness": [lossiness] + [value for value in LOSSINESS if value > lossiness],
+        "colors": [colors] + [value for value in COLORS if value < colors],
+        "step": STEPS,
+    }
+    position = {name: 0 for name in values}
+
+    def current():
+        return FitParameters(**{name: values[name][position[name]] for name in values})
+
+    ladder = [current()]
+    for name in ORDER:
+        if position[name] + 1 < len(values[name]):
+            position[name] += 1
+            ladder.append(current())
+    return ladder
+
+
+def keptFrames(timestamps, interval, keep_last=True):
+    # Indices of the frames left when frames less than interval after the
+    # last kept one are dropped. The last frame stays unless told otherwise,
+    # so the recording ends on what was on screen.
+    kept = []
+    next_time = None
+    for index, timestamp in enumerate(timestamps):
+        if next_time is None or timestamp >= next_time - 1e-6:
+            kept.append(index)
+            next_time = timestamp + interval
+
+    if keep_last and kept and kept[-1] != len(timestamps) - 1:
+        kept.append(len(timestamps) - 1)
+    return kept
+
+
+def composeFrames(frames):
+    # (full frame, crop) for each (frame, offset) crop. The same full frame
+    # array is yielded each time, updated in place.
+    canvas = None
+    for crop in frames:
+        frame, (left, top) = crop
+        if canvas is None:
+            canvas = np.array(frame)
+        else:
+            height, width = frame.shape[:2]
+            canvas[top:top + height, left:left + width] = frame
+        yield canvas, crop
+
+
+def scaleFrame(frame, scale, resample="bilinear"):
+    if scale == 1:
+        return frame
+
+    height, width = frame.shape[:2]
+    size = (max(round(width * scale), 1), max(round(height * scale), 1))
+    return np.asarray(Image.fromarray(frame).resize(size, RESAMPLING[resample]))
+
+
+# Counts the bytes each frame takes instead of keeping them
+class TrialEncoder(GifEncoder):
+
+    def __init__(self):
+        super().__init__(os.devnull)
+
+        # (duration, bytes) of each frame written
+        self.written = []
+
+    def write(self, image, duration, offset=(0, 0), local_palette=True, **params):
+        before = self.bytes
+        super().write(image, duration, offset, local_palette, **params)
+        self.written.append((duration, self.bytes - before))
+
+
+# Stretches of a recording to run trial encodes on, and the full frames the
+# palette is built from. Made in one pass over the frames, so spooled ones
+# are only read once.
+class FitSample:
+
+    def __init__(self, frames, timestamps, end, interval, palette_frames=10,
+                 dither="none"):
+        self.duration = end
+        self.dither = dither
+        self.windows = []
+        self.palette_frames = []
+
+        count = len(timestamps)
+        palette_indices = set(np.linspace(
+            0, count - 1, min(palette_frames, count)).round().astype(int).tolist())
+
+        # Long enough for the frames of a window at the lowest fps
+        length = WINDOW_FRAMES * max(STEPS) * interval
+        self.whole = end <= SAMPLE_WINDOWS * length
+        if self.whole:
+            starts = [0]
+            length = end
+        else:
+            starts = np.linspace(0, end - length, SAMPLE_WINDOWS).tolist()
+
+        # Each window holds the full frame it starts with, then the crops
+        # after it, with timestamps relative to its start
+        windows = [{"start": start, "end": min(start + length, end),
+                    "frames": [], "timestamps": []} for start in starts]
+
+        for index, ((canvas, crop), timestamp) in enumerate(
+                zip(composeFrames(frames), timestamps)):
+            if index in palette_indices:
+                self.palette_frames.append(canvas.copy())
+
+            for window in windows:
+                if not window["start"] <= timestamp < window["end"]:
+                    continue
+                if window["frames"]:
+                    window["frames"].append(crop)
+                else:
+                    window["frames"].append((canvas.copy(), (0, 0)))
+                window["timestamps"].append(timestamp - window["start"])
+
+        self.windows = [window for window in windows if window["frames"]]
+
+    def palette(self, scale, colors, resample):
+        frames = [scaleFrame(frame, scale, resample) for frame in self.palette_frames]
+        return buildPalette(frames, colors, self.dither)
+
+
+def renderFrames(frames, timestamps, parameters, interval, end, resample,
+                 count=None):
+    # (frames, delays) of crops with the fps and scale of parameters, only
+    # the first count of them if given
+    kept = keptFrames(timestamps, interval * parameters.step, count is None)
+    if count is not None and len(kept) > count:
+        end = timestamps[kept[count]]
+        kept = kept[:count]
+    delays = frameDelays([timestamps[index] for index in kept],
+                         interval * parameters.step, end)
+
+    def generate():
+        wanted = set(kept)
+        for index, (canvas, _) in enumerate(composeFrames(frames)):
+            if index in wanted:
+                yield scaleFrame(canvas, parameters.scale, resample), (0, 0)
+
+    return generate(), delays
+
+
+def estimateSize(sample, parameters, interval, resample):
+    # Expected file size with parameters, from trial encodes of the sample's
+    # windows: the first frame of each is a full one, the bytes of the rest
+    # after the warm-up over the seconds they are shown give the rate the
+    # recording goes on at
+    # With the whole recording in the sample, the trial is the real thing
+    warmup = 0
+    length = None
+    if not sample.whole:
+        warmup = WARMUP_FRAMES * parameters.step * interval * 1000
+        length = WINDOW_FRAMES
+
+    palette = None
+    header = first = first_seconds = rest = rest_seconds = 0
+    for window in sample.windows:
+        # Optimizers keep what is on screen, each window needs its own
+        optimizer = FrameOptimizer(parameters.colors, parameters.lossiness)
+        if palette is None:
+            palette = sample.palette(parameters.scale, optimizer.colors, resample)
+
+        encoder = TrialEncoder()
+        frames, delays = renderFrames(
+            window["frames"], window["timestamps"], parameters, interval,
+            window["end"] - window["start"], resample, length)
+        encodeFrames(encoder, FrameIndexer(palette, optimizer), frames, delays)
+
+        written = encoder.written
+        header = encoder.bytes - sum(size for _, size in written)
+        first += written[0][1]
+        first_seconds += written[0][0] / 1000
+
+        shown = written[0][0]
+        for duration, size in written[1:]:
+            if shown >= warmup:
+                rest += size
+                rest_seconds += duration / 1000
+            shown += duration
+
+    count = len(sample.windows)
+    rate = rest / rest_seconds if rest_seconds else 0
+    shown = max(sample.duration - first_seconds / count, 0)
+    return round(header + first / count + rate * shown)
+
+
+def searchParameters(sample, ladder, limit, interval, resample, workers):
+    # Index of the first rung of the ladder estimated to fit under limit, or
+    # the last one if none does, and the estimates made. Each round tries
+    # up to workers rungs spread over what is left of the ladder at the same
+    # time, numpy and PIL let go of the GIL for the heavy parts. The fitting
+    # rung is somewhere in [low, high).
+    estimates = {}
+    low, high = 0, len(ladder)
+
+    with ThreadPoolExecutor(workers) as pool:
+        while low < high:
+            count = min(workers, high - low)
+            if estimates:
+                indices = {low + (high - low) * (step + 1) // (count + 1)
+                           for step in range(count)}
+            else:
+                # The recording's own settings go first, they may well fit
+                indices = {high * step // count for step in range(count)}
+            indices = sorted(indices)
+
+            sizes = pool.map(lambda index: estimateSize(
+                sample, ladder[index], interval, resample), indices)
+            estimates.update(zip(indices, sizes))
+
+            fitting = [index for index in indices if estimates[index] <= limit * MARGIN]
+            if fitting:
+                high = fitting[0]
+            low = max([index + 1 for index in indices if index < high], default=low)
+
+    return min(high, len(ladder) - 1), estimates
+
+
+def fitFrames(path, frames, timestamps, interval, end, options, workers=None):
+    # Encodes (frame, offset) crops into a GIF at path that fits under
+    # options.target_size MB, lowering scale, colors, fps and raising
+    # lossiness as little as needed. Returns the number of frames written
+    # and a report of what was picked.
+    started = time.perf_counter()
+    limit = round(options.target_size * 1024 * 1024)
+    workers = workers or os.cpu_count() or 1
+    resample = options.resample
+
+    lossiness = options.lossiness if options.optimize else 0
+    colors = options.colors if options.optimize else 256
+    ladder = parameterLadder(lossiness, colors)
+
+    sample = FitSample(frames, timestamps, end, interval, options.palette_frames,
+                       options.dither)
+    index, estimates = searchParameters(sample, ladder, limit, interval, resample,
+                                        workers)
+    search_time = time.perf_counter() - started
+
+    # Estimates can be off, if the file doesn't fit go further down the
+    # ladder, correcting estimates by how far off this one was
+    encodes = 0
+    while True:
+        parameters = ladder[index]
+        optimizer = FrameOptimizer(parameters.colors, parameters.lossiness)
+        palette = sample.palette(parameters.scale, optimizer.colors, resample)
+        rendered, delays = renderFrames(frames, timestamps, parameters, interval,
+                                        end, resample)
+        frame_count = writeFrames(path, rendered, delays, palette, optimizer)
+        encodes += 1
+
+        size = os.path.getsize(path)
+        if size <= limit or index == len(ladder) - 1:
+            break
+
+        correction = size / estimates[index]
+        while index < len(ladder) - 1:
+            index += 1
+            if index not in estimates:
+                estimates[index] = estimateSize(sample, ladder[index], interval,
+                                                resample)
+            if estimates[index] * correction <= limit * MARGIN:
+                break
+
+    report = {
+        "limit": limit,
+        "fits": size <= limit,
+        "scale": round(options.scale * parameters.scale, 3),
+        "lossiness": parameters.lossiness,
+        "colors": optimizer.colors,
+        "fps": round(1 / (interval * parameters.step), 2),
+        "estimated_size": estimates[index],
+        "trials": len(estimates),
+        "encodes": encodes,
+        "search_time": round(search_time, 3),
+    }
+    return frame_count, report
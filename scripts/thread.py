@@ -1,69 +1,112 @@
 import os
 from PyQt6.QtCore import QObject, pyqtSignal
-import imageio
 import time
-import mss
-from PIL import Image
-from pygifsicle import gifsicle
+import traceback
 from scripts.saved import GlobalSettings
+from scripts.recorder import Recorder, RecordingOptions
+from scripts.backends import MssBackend
+from scripts.formats import EXTENSIONS
+from scripts.jobs import EncodeJob
+from scripts.library import Library
+from scripts.thumbnails import ThumbnailCache
 import scripts.saved as settings
 
 
+# Lives on the capture service's worker thread and runs one recording at a
+# time on it. The screen grabber stays open between recordings, mss handles
+# have to be used from the thread that made them.
 class GifThread(QObject):
 
+    # The path of the recording, once it has one
+    started = pyqtSignal(str)
     finished = pyqtSignal()
-    stop = pyqtSignal()
     startSaving = pyqtSignal()
 
-    def __init__(self, region):
+    # Live capture metrics, about once a second while recording
+    metrics = pyqtSignal(dict)
+
+    def __init__(self, jobs):
         super().__init__()
-        self.region = region
+        self.jobs = jobs
         self.stopped = False
+        self.backend = None
+
+    def warmUp(self):
+        if self.backend is None:
+            backend = MssBackend(keep_open=True)
+            backend.connect()
+            self.backend = backend
+
+    def prepare(self):
+        # Ahead of the first recording, which tries again if this fails
+        try:
+            self.warmUp()
+        except Exception:
+            traceback.print_exc()
+
+    def run(self, region, delay):
+        # The service goes back to idle even if the recording failed
+        try:
+            self.record(region, delay)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            self.finished.emit()
 
-    def run(self):
-        screenshots = []
-        fps = GlobalSettings.value(settings.SETTING_FPS, settings.defaultFps)
-        scale_factor = GlobalSettings.value(
-            settings.SETTING_RESOLUTION, settings.defaultResolution)
-        should_optimize = GlobalSettings.value(
-            settings.SETTING_OPTIMIZING, settings.defaultOptimizing)
-        lossiness = GlobalSettings.value(
-            settings.SETTING_COMPRESSION, settings.defaultCompression)
-        time.sleep(0.3)
+    def record(self, region, delay):
+        self.warmUp()
+        options = RecordingOptions.fromSettings()
+        time.sleep(delay)
 
         # Make Path
-        path = GlobalSettings.value(
+        directory = GlobalSettings.value(
             settings.SETTING_SAVEDIRECTORY, settings.defaultDirectory)
-        num = len(os.listdir(path))
-        filename = f"/gif_{num}.gif"
+        # The library hands out the name and creates the file, so recordings
+        # still waiting to be saved don't end up with the same name
+        library = Library(directory)
+        cache = ThumbnailCache.fromSettings(directory)
+        capture_id, path = library.allocate(
+            EXTENSIONS[options.format], region, options)
+        name = os.path.basename(path)
 
-        path = path + filename
+        # Metrics of each recording go next to it, in the stats folder
+        if GlobalSettings.value(settings.SETTING_STATSFILE,
+                                settings.defaultStatsFile, type=bool):
+            options.stats_file = os.path.join(
+                directory, "stats", os.path.splitext(name)[0] + ".jsonl")
 
+        self.started.emit(path)
         print(path)
-
         print("Running")
-        with mss.mss() as sct:
-            while not self.stopped:
-                # Get raw pixels from the screen, save it to a Numpy array
-                screenshot = sct.grab(self.region)
-                # Convert to a PIL Image
-                image = Image.frombytes(
-                    "RGB", screenshot.size, screenshot.bgra, "raw", "BGRX")
-
-                image = image.convert(dither=Image.Dither.NONE)
-
-                screenshots.append(image)
-                time.sleep(1/fps)
-
-        self.startSaving.emit()
+        # A recording that fails before saving leaves nothing worth keeping
+        try:
+            recorder = Recorder(region, path, options, self.backend)
+            recorder.record(lambda: self.stopped, self.metrics.emit)
+        except Exception:
+            library.fail(capture_id)
+            if os.path.exists(path):
+                os.remove(path)
+            raise
 
-        imageio.mimsave(path, screenshots,
-                        duration=1/fps)
+        def save():
+            try:
+                stats = recorder.save()
+            except Exception:
+                library.fail(capture_id)
+                raise
+            library.finish(capture_id, stats)
+            print(stats)
+            print("Done")
 
-        # If we are optimizing our image, do it
-        if should_optimize:
-            gifsicle(sources=path, colors=256,
-                     optimize=True, options=[f"--lossy={lossiness}", "--scale", str(scale_factor)])
+            # The library shows what was captured without decoding the file
+            preview = recorder.preview
+            if preview.thumbnail():
+                cache.store(path, preview.thumbnail(), preview.strip())
+            return stats
 
-        print("Done")
-        self.finished.emit()
+        # Saving goes to the background queue. Only when that would go over
+        # its memory limit does the overlay wait, like it used to.
+        job = EncodeJob(name, save, recorder.heldBytes())
+        if self.jobs.wouldWait(job.held):
+            self.startSaving.emit()
+        self.jobs.submit(job)
@@ -0,0 +1,307 @@
+import hashlib
+import os
+import sqlite3
+import time
+import numpy as np
+from PIL import Image, ImageSequence
+import scripts.saved as settings
+
+
+# Longest side of a thumbnail, and how the preview strip samples a recording
+THUMBNAIL_SIZE = 160
+STRIP_FPS = 2
+STRIP_FRAMES = 8
+
+CACHE_FOLDER = "thumbnails"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY,
+    mtime INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS thumbnails (
+    key TEXT PRIMARY KEY,
+    bytes INTEGER NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS thumbnails_used ON thumbnails (used);
+PRAGMA user_version = 1;
+"""
+SCHEMA_VERSION = 1
+
+
+def shrink(frame, size=THUMBNAIL_SIZE):
+    # Thumbnail of an (h, w, 3) frame. Striding first keeps the resize small.
+    # The image gets its own copy, frames can be reused after.
+    height, width = frame.shape[:2]
+    step = max(max(height, width) // (size * 2), 1)
+    image = Image.fromarray(np.array(frame[::step, ::step]))
+    image.thumbnail((size, size), Image.Resampling.BILINEAR)
+    return image
+
+
+def joinStrip(images):
+    # Frames side by side, the view shows them one at a time
+    width, height = images[0].size
+    strip = Image.new("RGB", (width * len(images), height))
+    for i, image in enumerate(images):
+        strip.paste(image.resize((width, height)), (i * width, 0))
+    return strip
+
+
+# Picks up the preview of a recording from frames that are in memory anyway:
+# the first frame, and frames about STRIP_FPS apart for the strip. Long
+# recordings thin out the frames kept, so it never holds more than twice
+# STRIP_FRAMES small images.
+class PreviewCollector:
+
+    def __init__(self, size=THUMBNAIL_SIZE, fps=STRIP_FPS, frames=STRIP_FRAMES):
+        self.size = size
+        self.frames = frames
+        self.interval = 1 / fps
+        self.next = None
+        self.samples = []
+
+    def add(self, frame, timestamp):
+        if self.next is not None and timestamp < self.next:
+            return
+
+        self.samples.append(shrink(frame, self.size))
+        self.next = timestamp + self.interval
+        if len(self.samples) >= 2 * self.frames:
+            self.samples = self.samples[::2]
+            self.interval *= 2
+
+    def thumbnail(self):
+        return self.samples[0] if self.samples else None
+
+    def strip(self):
+        if not self.samples:
+            return None
+
+        count = min(self.frames, len(self.samples))
+        picks = np.linspace(0, len(self.samples) - 1, count).round().astype(int)
+        return joinStrip([self.samples[i] for i in picks])
+
+
+def readPreview(path, size=THUMBNAIL_SIZE, fps=STRIP_FPS, frames=STRIP_FRAMES):
+    # Preview of a recording from disk, for ones saved without it. Returns
+    # (thumbnail, strip), or None if the file can't be read.
+    collector = PreviewCollector(size, fps, frames)
+    try:
+        if path.lower().endswith(".mp4"):
+            import imageio.v2 as imageio
+            with imageio.get_reader(path, format="FFMPEG") as reader:
+                rate = reader.get_meta_data().get("fps") or 25
+                for i, frame in enumerate(reader):
+                    collector.add(frame, i / rate)
+        else:
+            with Image.open(path) as image:
+                timestamp = 0
+                for frame in ImageSequence.Iterator(image):
+                    collector.add(np.asarray(frame.convert("RGB")), timestamp)
+                    timestamp += frame.info.get("duration", 100) / 1000
+    except Exception as error:
+        print(f"No preview for {path}: {error}")
+        return None
+
+    if not collector.samples:
+        return None
+    return collector.thumbnail(), collector.strip()
+
+
+# Thumbnails and preview strips of the recordings in a save directory, kept
+# in its thumbnails folder. Entries are keyed by the file's hash and mtime,
+# so renamed files keep theirs and changed files get new ones. Hashes are
+# only computed again when a file's mtime changes. Once the entries go over
+# limit bytes, the least recently used ones are removed.
+#
+# Calls open their own connection, unless a pass over many recordings is
+# open: then they share one, on the thread that opened it, and the used
+# times of get() are written together when it closes.
+class ThumbnailCache:
+
+    def __init__(self, directory, limit):
+        self.directory = directory
+        self.folder = os.path.join(directory, CACHE_FOLDER)
+        self.path = os.path.join(self.folder, "index.sqlite3")
+        self.limit = limit
+        self.connection = None
+        self.used = []
+        os.makedirs(self.folder, exist_ok=True)
+
+        if not os.path.exists(self.path):
+            self.createSchema()
+            return
+
+        connection = self.connect()
+        try:
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            connection.close()
+        if version < SCHEMA_VERSION:
+            self.createSchema()
+
+    @classmethod
+    def fromSettings(cls, directory):
+        limit = settings.GlobalSettings.value(
+            settings.SETTING_THUMBNAILCACHE, settings.defaultThumbnailCache, type=int)
+        return cls(directory, limit * 1024 * 1024)
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def createSchema(self):
+        connection = self.connect()
+        try:
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+    def open(self):
+        self.connection = self.connect()
+        self.used = []
+
+    def close(self):
+        connection = self.connection
+        self.connection = None
+        try:
+            self.writeUsed(connection)
+        finally:
+            self.used = []
+            connection.close()
+
+    def writeUsed(self, connection):
+        # The used times the pass kept back, in one transaction
+        if self.used:
+            connection.execute("BEGIN")
+            connection.executemany(
+                "UPDATE thumbnails SET used = ? WHERE key = ?", self.used)
+            connection.execute("COMMIT")
+            self.used = []
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def acquire(self):
+        # The open pass's connection, or one of its own for this call
+        return self.connection or self.connect()
+
+    def release(self, connection):
+        if connection is not self.connection:
+            connection.close()
+
+    def key(self, path):
+        name = os.path.basename(path)
+        mtime = os.stat(path).st_mtime_ns
+
+        connection = self.acquire()
+        try:
+            row = connection.execute(
+                "SELECT hash FROM files WHERE name = ? AND mtime = ?",
+                (name, mtime)).fetchone()
+            if row:
+                return f"{row[0]}_{mtime}"
+
+            digest = hashlib.blake2b(digest_size=16)
+            with open(path, "rb") as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            file_hash = digest.hexdigest()
+
+            connection.execute(
+                "INSERT OR REPLACE INTO files (name, mtime, hash) VALUES (?, ?, ?)",
+                (name, mtime, file_hash))
+            return f"{file_hash}_{mtime}"
+        finally:
+            self.release(connection)
+
+    def paths(self, key):
+        return (os.path.join(self.folder, f"{key}.png"),
+                os.path.join(self.folder, f"{key}_strip.png"))
+
+    def get(self, path):
+        # (thumbnail path, strip path) of a recording, None if not cached
+        key = self.key(path)
+        paths = self.paths(key)
+
+        connection = self.acquire()
+        try:
+            row = connection.execute(
+                "SELECT 1 FROM thumbnails WHERE key = ?", (key,)).fetchone()
+            if row and all(os.path.exists(file) for file in paths):
+                if connection is self.connection:
+                    self.used.append((time.time(), key))
+                else:
+                    connection.execute(
+                        "UPDATE thumbnails SET used = ? WHERE key = ?",
+                        (time.time(), key))
+                return paths
+
+            connection.execute("DELETE FROM thumbnails WHERE key = ?", (key,))
+            return None
+        finally:
+            self.release(connection)
+
+    def store(self, path, thumbnail, strip):
+        key = self.key(path)
+        paths = self.paths(key)
+        thumbnail.save(paths[0])
+        strip.save(paths[1])
+        size = sum(os.path.getsize(file) for file in paths)
+
+        connection = self.acquire()
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO thumbnails (key, bytes, used) VALUES (?, ?, ?)",
+                (key, size, time.time()))
+        finally:
+            self.release(connection)
+
+        self.evict()
+        return paths
+
+    def preview(self, path):
+        # Cached previews, made from the file the first time
+        paths = self.get(path)
+        if paths:
+            return paths
+
+        preview = readPreview(path)
+        if preview is None:
+            return None
+        return self.store(path, *preview)
+
+    def evict(self):
+        connection = self.acquire()
+        try:
+            # Recordings shown in this pass are not the least recently used
+            if connection is self.connection:
+                self.writeUsed(connection)
+
+            total = connection.execute(
+                "SELECT COALESCE(SUM(bytes), 0) FROM thumbnails").fetchone()[0]
+            if total <= self.limit:
+                return
+
+            rows = connection.execute(
+                "SELECT key, bytes FROM thumbnails ORDER BY used")
+            removed = []
+            for key, size in rows:
+                if total <= self.limit:
+                    break
+                removed.append(key)
+                total -= size
+
+            for key in removed:
+                connection.execute("DELETE FROM thumbnails WHERE key = ?", (key,))
+                for file in self.paths(key):
+                    if os.path.exists(file):
+                        os.remove(file)
+        finally:
+            self.release(connection)